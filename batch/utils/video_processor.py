@@ -16,8 +16,12 @@ def process_video(file, dubbing=False):
         ("Splitting sentences", split_sentences),
         ("Summarizing and translating", summarize_and_translate),
         ("Processing and aligning subtitles", process_and_align_subtitles),
-        ("Merging subtitles to video", step7_merge_sub_to_vid.merge_subtitles_to_video),
     ]
+    # with dubbing, step11 can burn the subtitles while mixing the audio, so the video is encoded only once
+    # batch-only: st.py shows the subtitled video before dubbing and step11 then only stream-copies it
+    single_pass = dubbing and load_key("single_pass_render", default=True) and load_key("subtitle_mode", default='burn') == 'burn'
+    if not single_pass:
+        steps.append(("Merging subtitles to video", step7_merge_sub_to_vid.merge_subtitles_to_video))
     
     if dubbing:
         steps.extend([
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of core.text_metrics against the per-line functions it replaced.
+    python benchmarks/text_metrics.py --lines 5000
+"""
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import re
+import time
+import random
+import argparse
+import numpy as np
+from core.text_metrics import calc_lens, estimate_reading_durations, _lookup_tables
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+MULTIPLIER = 1.2 * 1.4  # speed_factor normal * max of the default config
+
+# ------------
+# the per-line implementations before text_metrics, kept verbatim as the reference
+# ------------
+
+def legacy_calc_len(text):
+    text = str(text)
+    def char_weight(char):
+        code = ord(char)
+        if 0x4E00 <= code <= 0x9FFF or 0x3040 <= code <= 0x30FF:
+            return 1.75
+        elif 0xAC00 <= code <= 0xD7A3 or 0x1100 <= code <= 0x11FF:
+            return 1.5
+        elif 0x0E00 <= code <= 0x0E7F:
+            return 1
+        elif 0xFF01 <= code <= 0xFF5E:
+            return 1.75
+        else:
+            return 1
+    return sum(char_weight(char) for char in text)
+
+def legacy_reading_duration(text):
+    chinese_japanese_chars = len(re.findall(r'[\u4e00-\u9fff\u3040-\u30ff\u3400-\u4dbf\uf900-\ufaff\uff66-\uff9f]', text))
+    en_and_others_words = len(re.findall(r'\b[a-zA-ZàâçéèêëîïôûùüÿñæœáéíóúüñÁÉÍÓÚÜÑàèéìíîòóùúÀÈÉÌÍÎÒÓÙÚäöüßÄÖÜа-яА-Я]+\b', text))
+    punctuation_count = len(re.findall(r'[,.!?;:，。！？；：](?=.)', text))
+    return chinese_japanese_chars / (4 * MULTIPLIER) + en_and_others_words / (5 * MULTIPLIER) + punctuation_count / (4 * MULTIPLIER)
+
+def make_subtitles(count, seed=0):
+    """Mixed English / Chinese / Japanese subtitle lines of typical length"""
+    rng = random.Random(seed)
+    words = ['the', 'network', 'training', 'really', 'GPUs', 'Coursera', 'café', 'это']
+    cjk = '我们今天讨论神经网络的训练方法ですからこれは'
+    lines = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            lines.append(' '.join(rng.choice(words) for _ in range(rng.randint(4, 16))) + rng.choice(['.', '?', ',', '']))
+        else:
+            lines.append(''.join(rng.choice(cjk) for _ in range(rng.randint(6, 30))) + rng.choice(['。', '，', '？', '']))
+    return lines
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--lines', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    subtitles = make_subtitles(args.lines)
+    _lookup_tables()  # one-off table build, not part of the per-call cost
+
+    cases = [
+        ('calc_len', lambda: [legacy_calc_len(text) for text in subtitles], lambda: calc_lens(subtitles)),
+        ('reading duration', lambda: [legacy_reading_duration(text) for text in subtitles], lambda: estimate_reading_durations(subtitles, MULTIPLIER)),
+    ]
+    table = Table(title=f"text_metrics, {args.lines} subtitles, best of {args.repeat}")
+    for column in ['Metric', 'Per line (ms)', 'Vectorized (ms)', 'Speed-up', 'Same result']:
+        table.add_column(column)
+    for name, legacy, vectorized in cases:
+        legacy_time, legacy_result = best_of(legacy, args.repeat)
+        vectorized_time, vectorized_result = best_of(vectorized, args.repeat)
+        same = np.allclose(legacy_result, vectorized_result)
+        table.add_row(name, f"{legacy_time * 1000:.1f}", f"{vectorized_time * 1000:.1f}", f"{legacy_time / vectorized_time:.1f}x", '✅' if same else '❌')
+    console.print(table)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare the two_step and one_shot translation modes on a fixed transcript.
+Run from the project root with a configured config.yaml:
+    python benchmarks/translate_modes.py --rounds 3
+Streamed answers carry no token usage, so llm_stream is switched off for the run and restored afterwards.
+"""
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+import argparse
+from core.translate_once import translate_lines
+from core.ask_gpt import get_usage_stats
+from core.config_utils import load_key, update_key
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# one chunk of a talk, small enough to fit every model's budget
+TRANSCRIPT = '''All of you know Andrew Ng as a famous computer science professor at Stanford.
+He was really early on in the development of neural networks with GPUs.
+Of course, a creator of Coursera and popular courses like deeplearning.ai.
+Also the founder and creator and early lead of Google Brain.
+But there's one thing I've always wanted to ask you before I hand it over, Andrew.
+When you look at the next ten years of AI, what are you most excited about?
+I think agentic workflows will drive massive progress this year.
+Today most of us use language models in a zero-shot way, we type a prompt and get an answer.
+That's a bit like asking someone to write an essay from start to finish without ever hitting backspace.
+With an agentic workflow, the model can write a draft, read it over, and revise it.
+It turns out this iterative process gives much better results.
+So that's what I want to talk about today.'''
+THEME = 'A fireside chat about recent progress in AI agents and language models.'
+
+def run_mode(mode, rounds):
+    get_usage_stats(reset=True)
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        translate_lines(TRANSCRIPT, None, None, None, THEME, mode=mode)
+        latencies.append(time.perf_counter() - start)
+    usage = get_usage_stats(reset=True)
+    requests = sum(stats['requests'] for stats in usage.values())
+    prompt_tokens = sum(stats['prompt_tokens'] for stats in usage.values())
+    completion_tokens = sum(stats['completion_tokens'] for stats in usage.values())
+    return {
+        'latency': sum(latencies) / rounds,
+        'requests': requests / rounds,
+        'prompt_tokens': prompt_tokens / rounds,
+        'completion_tokens': completion_tokens / rounds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=3, help='translations per mode, results are averaged')
+    args = parser.parse_args()
+
+    streaming = load_key("llm_stream", default=False)
+    if streaming:
+        update_key("llm_stream", False)
+    try:
+        results = {mode: run_mode(mode, args.rounds) for mode in ['two_step', 'one_shot']}
+    finally:
+        if streaming:
+            update_key("llm_stream", True)
+
+    table = Table(title=f"Translation modes, {len(TRANSCRIPT.splitlines())} lines, mean of {args.rounds} rounds")
+    for column in ['Mode', 'Latency (s)', 'Requests', 'Prompt tokens', 'Completion tokens']:
+        table.add_column(column)
+    for mode, result in results.items():
+        table.add_row(mode, f"{result['latency']:.1f}", f"{result['requests']:.1f}", f"{result['prompt_tokens']:.0f}", f"{result['completion_tokens']:.0f}")
+    console.print(table)
+
+if __name__ == '__main__':
+    main()
@@ -3,25 +3,34 @@ warnings.filterwarnings("ignore")
 import os,sys
 import whisperx
 import torch
+import numpy as np
 from typing import Dict
-import librosa
 from rich import print as rprint
 from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
-import subprocess
-import tempfile
+import threading
+import queue
+import gc
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from core.config_utils import load_key
+from core.artifact_store import artifact_exists
 from core.all_whisper_methods.demucs_vl import demucs_main
-from core.all_whisper_methods.whisperXapi import process_transcription, convert_video_to_audio, split_audio, save_results, save_language
-from core.all_whisper_methods.whisperXapi import RAW_AUDIO_FILE, BACKGROUND_AUDIO_FILE, VOCAL_AUDIO_FILE, AUDIO_DIR
+from core.all_whisper_methods.whisperXapi import process_transcription, convert_video_to_audio, load_audio_array, remove_audio_array, split_audio, save_results, save_language
+from core.all_whisper_methods.whisperXapi import RAW_AUDIO_FILE, BACKGROUND_AUDIO_FILE, VOCAL_AUDIO_FILE, AUDIO_DIR, SAMPLE_RATE
 
 MODEL_DIR = load_key("model_dir")
+# evict resident models before loading another one when less than this share of GPU memory is free
+MIN_FREE_GPU_MEMORY_RATIO = 0.3
+# segments waiting between pipeline stages, each holds a view of the track plus its VAD chunks
+PIPELINE_QUEUE_SIZE = 2
+_STAGE_DONE = object()
 
-def transcribe_audio(audio_file: str, start: float, end: float) -> Dict:
-    WHISPER_LANGUAGE = load_key("whisper.language")
+# Models stay loaded across segments and batch videos, keyed by their load parameters
+_asr_models = {}
+_align_models = {}
+MODELS_LOCK = threading.Lock()
+
+def get_device_settings():
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    rprint(f"🚀 Starting WhisperX using device: {device} ...")
-    
     if device == "cuda":
         gpu_mem = torch.cuda.get_device_properties(0).total_memory / (1024**3)
         batch_size = 16 if gpu_mem > 8 else 2
@@ -31,22 +40,43 @@ def transcribe_audio(audio_file: str, start: float, end: float) -> Dict:
         batch_size = 1
         compute_type = "int8"
         rprint(f"[cyan]📦 Batch size:[/cyan] {batch_size}, [cyan]⚙️ Compute type:[/cyan] {compute_type}")
-    rprint(f"[green]▶️ Starting WhisperX for segment {start:.2f}s to {end:.2f}s...[/green]")
-    
-    try:
-        if WHISPER_LANGUAGE == 'zh':
-            model_name = "Huan69/Belle-whisper-large-v3-zh-punct-fasterwhisper"
-            local_model = os.path.join(MODEL_DIR, "Belle-whisper-large-v3-zh-punct-fasterwhisper")
-        else:
-            model_name = "large-v3"
-            local_model = os.path.join(MODEL_DIR, "large-v3")
-            
-        if os.path.exists(local_model):
-            rprint(f"[green]📥 Loading local WHISPER model:[/green] {local_model} ...")
-            model_name = local_model
+    return device, batch_size, compute_type
+
+def release_whisper_models():
+    """Drop every resident WhisperX model and free the GPU memory they hold"""
+    with MODELS_LOCK:
+        _asr_models.clear()
+        _align_models.clear()
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+def evict_if_memory_tight(device):
+    if device != "cuda" or not (_asr_models or _align_models):
+        return
+    free, total = torch.cuda.mem_get_info()
+    if free / total < MIN_FREE_GPU_MEMORY_RATIO:
+        rprint(f"[yellow]🧹 Only {free / total:.0%} GPU memory free, releasing resident WhisperX models...[/yellow]")
+        release_whisper_models()
+
+def get_whisper_model_name(whisper_language):
+    if whisper_language == 'zh':
+        model_name = "Huan69/Belle-whisper-large-v3-zh-punct-fasterwhisper"
+        local_model = os.path.join(MODEL_DIR, "Belle-whisper-large-v3-zh-punct-fasterwhisper")
+    else:
+        model_name = "large-v3"
+        local_model = os.path.join(MODEL_DIR, "large-v3")
+    return local_model if os.path.exists(local_model) else model_name
+
+def get_asr_model(model_name, device, compute_type, language):
+    """ASR pipeline (with its VAD model), loaded once per (model, device, compute_type, language)"""
+    key = (model_name, device, compute_type, language)
+    if key not in _asr_models:
+        evict_if_memory_tight(device)
+        if os.path.exists(model_name):
+            rprint(f"[green]📥 Loading local WHISPER model:[/green] {model_name} ...")
         else:
             rprint(f"[green]📥 Using WHISPER model from HuggingFace:[/green] {model_name} ...")
-
         vad_options = {
                 "vad_onset": 0.500,
                 "vad_offset": 0.363
@@ -55,20 +85,48 @@ def transcribe_audio(audio_file: str, start: float, end: float) -> Dict:
                 "temperatures": [0],
                 "initial_prompt": "",
             }
+        model = whisperx.load_model(model_name, device, compute_type=compute_type, language=language, vad_options=vad_options, asr_options=asr_options, download_root=MODEL_DIR)
+        with MODELS_LOCK:
+            _asr_models[key] = model
+    return _asr_models[key]
+
+def get_align_model(language_code, device):
+    key = (language_code, device)
+    if key not in _align_models:
+        evict_if_memory_tight(device)
+        rprint(f"[green]📥 Loading alignment model for:[/green] {language_code} ...")
+        model_a, metadata = whisperx.load_align_model(language_code=language_code, device=device)
+        with MODELS_LOCK:
+            _align_models[key] = (model_a, metadata)
+    return _align_models[key]
+
+def shift_timestamps(result: Dict, start: float) -> Dict:
+    for segment in result['segments']:
+        segment['start'] += start
+        segment['end'] += start
+        for word in segment['words']:
+            if 'start' in word:
+                word['start'] += start
+            if 'end' in word:
+                word['end'] += start
+    return result
+
+def check_language(result: Dict):
+    save_language(result['language'])
+    if result['language'] == 'zh' and load_key("whisper.language") != 'zh':
+        raise ValueError("请指定转录语言为 zh 后重试！")
+
+def transcribe_audio(audio: np.ndarray, start: float, end: float, device_settings=None) -> Dict:
+    WHISPER_LANGUAGE = load_key("whisper.language")
+    device, batch_size, compute_type = device_settings or get_device_settings()
+    rprint(f"[green]▶️ Starting WhisperX for segment {start:.2f}s to {end:.2f}s using device: {device} ...[/green]")
+    
+    try:
         whisper_language = None if 'auto' in WHISPER_LANGUAGE else WHISPER_LANGUAGE
-        model = whisperx.load_model(model_name, device, compute_type=compute_type, language=whisper_language, vad_options=vad_options, asr_options=asr_options, download_root=MODEL_DIR)
-
-        # Create temporary file to store audio segment
-        temp_audio = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-        temp_audio_path = temp_audio.name
-        temp_audio.close()
-        # Use ffmpeg to cut audio
-        ffmpeg_cmd = f'ffmpeg -y -i "{audio_file}" -ss {start} -t {end-start} -vn -b:a 64k -ar 16000 -ac 1 -metadata encoding=UTF-8 -f mp3 "{temp_audio_path}"'
-        subprocess.run(ffmpeg_cmd, shell=True, check=True, capture_output=True)
-        # Load the cut audio
-        audio_segment, sample_rate = librosa.load(temp_audio_path, sr=16000)
-        # Delete temporary file
-        os.unlink(temp_audio_path)
+        model = get_asr_model(get_whisper_model_name(WHISPER_LANGUAGE), device, compute_type, whisper_language)
+
+        # Slice the decoded track, a view into the memory-mapped samples
+        audio_segment = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
 
         with Progress(
             SpinnerColumn(),
@@ -81,39 +139,82 @@ def transcribe_audio(audio_file: str, start: float, end: float) -> Dict:
             result = model.transcribe(audio_segment, batch_size=batch_size)
             progress.update(task, completed=True)
 
-        # Free GPU resources
-        del model
-        torch.cuda.empty_cache()
-
-        # Save language
-        save_language(result['language'])
-        if result['language'] == 'zh' and WHISPER_LANGUAGE != 'zh':
-            raise ValueError("请指定转录语言为 zh 后重试！")
+        check_language(result)
 
         # Align whisper output
-        model_a, metadata = whisperx.load_align_model(language_code=result["language"], device=device)
+        model_a, metadata = get_align_model(result["language"], device)
         result = whisperx.align(result["segments"], model_a, metadata, audio_segment, device, return_char_alignments=False)
-
-        # Free GPU resources again
-        torch.cuda.empty_cache()
-        del model_a
-
-        # Adjust timestamps
-        for segment in result['segments']:
-            segment['start'] += start
-            segment['end'] += start
-            for word in segment['words']:
-                if 'start' in word:
-                    word['start'] += start
-                if 'end' in word:
-                    word['end'] += start
-        return result
+        return shift_timestamps(result, start)
     except Exception as e:
         rprint(f"[red]WhisperX processing error:[/red] {e}")
         raise
 
+def run_stage(work, inbox: queue.Queue, outbox: queue.Queue, errors: list):
+    """Apply work to every item of inbox until _STAGE_DONE. After any stage failed, keep draining so upstream never blocks"""
+    while True:
+        item = inbox.get()
+        if item is _STAGE_DONE:
+            break
+        if errors:
+            continue
+        try:
+            outbox.put(work(item))
+        except Exception as e:
+            errors.append(e)
+    outbox.put(_STAGE_DONE)
+
+def transcribe_pipelined(audio: np.ndarray, segments, device_settings) -> list:
+    """Slice+VAD, ASR and alignment run as separate stages, so segment N+1 is prepared and
+    segment N-1 aligned while segment N is in ASR. Results keep the order of segments"""
+    WHISPER_LANGUAGE = load_key("whisper.language")
+    device, batch_size, compute_type = device_settings
+    whisper_language = None if 'auto' in WHISPER_LANGUAGE else WHISPER_LANGUAGE
+    model = get_asr_model(get_whisper_model_name(WHISPER_LANGUAGE), device, compute_type, whisper_language)
+
+    def prepare(segment):
+        start, end = segment
+        audio_segment = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        return start, end, audio_segment, model.detect_speech(audio_segment)
+
+    def recognize(item):
+        start, end, audio_segment, vad_segments = item
+        rprint(f"[green]▶️ Transcribing segment {start:.2f}s to {end:.2f}s using device: {device} ...[/green]")
+        result = model.transcribe(audio_segment, batch_size=batch_size, vad_segments=vad_segments)
+        check_language(result)
+        return start, end, audio_segment, result
+
+    def align(item):
+        start, end, audio_segment, result = item
+        model_a, metadata = get_align_model(result["language"], device)
+        result = whisperx.align(result["segments"], model_a, metadata, audio_segment, device, return_char_alignments=False)
+        rprint(f"[green]✅ Segment {start:.2f}s to {end:.2f}s aligned[/green]")
+        return shift_timestamps(result, start)
+
+    pending = queue.Queue()
+    for segment in segments:
+        pending.put(segment)
+    pending.put(_STAGE_DONE)
+    prepared = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    transcribed = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    aligned = queue.Queue()
+    errors = []
+    stages = [
+        threading.Thread(target=run_stage, args=(prepare, pending, prepared, errors), daemon=True),
+        threading.Thread(target=run_stage, args=(recognize, prepared, transcribed, errors), daemon=True),
+        threading.Thread(target=run_stage, args=(align, transcribed, aligned, errors), daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+
+    if errors:
+        rprint(f"[red]WhisperX processing error:[/red] {errors[0]}")
+        raise errors[0]
+    return [result for result in iter(aligned.get_nowait, _STAGE_DONE)]
+
 def transcribe(video_file: str):
-    if os.path.exists("output/log/cleaned_chunks.xlsx"):
+    if artifact_exists('cleaned_chunks'):
         rprint("[yellow]⚠️ Transcription results already exist, skipping transcription step.[/yellow]")
         return
     
@@ -123,6 +224,8 @@ def transcribe(video_file: str):
     if os.path.exists(os.path.join(AUDIO_DIR, BACKGROUND_AUDIO_FILE)):
         rprint(f"[yellow]⚠️ {os.path.join(AUDIO_DIR, BACKGROUND_AUDIO_FILE)} already exists, skip Demucs processing.[/yellow]")
     else:
+        # models resident from a previous video may not leave room for demucs
+        evict_if_memory_tight("cuda" if torch.cuda.is_available() else "cpu")
         demucs_main(
             os.path.join(AUDIO_DIR, RAW_AUDIO_FILE),
             AUDIO_DIR,
@@ -131,16 +234,22 @@ def transcribe(video_file: str):
         )
         print("Demucs processing completed, original_vocal.mp3 and background.mp3 saved")
     
+    # step2 Decode the vocal track once, segments are cut from it in memory
     audio_file = os.path.join(AUDIO_DIR, VOCAL_AUDIO_FILE)
-
-    # step2 Extract audio
-    segments = split_audio(audio_file)
-    
-    # step3 Transcribe audio
-    all_results = []
-    for start, end in segments:
-        result = transcribe_audio(audio_file, start, end)
-        all_results.append(result)
+    audio = load_audio_array(audio_file)
+    try:
+        segments = split_audio(audio_file, audio=audio)
+        
+        # step3 Transcribe audio
+        device_settings = get_device_settings()
+        if load_key("whisper.pipeline", default=True):
+            all_results = transcribe_pipelined(audio, segments, device_settings)
+        else:
+            all_results = [transcribe_audio(audio, start, end, device_settings) for start, end in segments]
+    finally:
+        # the decoded track is as large as the whole video's audio in float32, drop it from output/
+        del audio
+        remove_audio_array(audio_file)
     
     # step4 Combine results
     combined_result = {'segments': []}
@@ -1,16 +1,21 @@
 import os, sys, subprocess, base64, time
 import replicate
+import numpy as np
 import pandas as pd
-from moviepy.editor import AudioFileClip
 from typing import Dict, List, Tuple
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from core.config_utils import load_key, update_key
+from core.artifact_store import save_artifact, artifact_exists
 from core.all_whisper_methods.demucs_vl import demucs_main
 
 RAW_AUDIO_FILE = "raw_full_audio.mp3"
 AUDIO_DIR = "output/audio"
 BACKGROUND_AUDIO_FILE = "background.mp3"
 VOCAL_AUDIO_FILE = "vocal.mp3"
+SAMPLE_RATE = 16000
+# same thresholds as ffmpeg silencedetect=n=-30dB:d=0.5
+SILENCE_THRESHOLD_DB = -30
+SILENCE_MIN_DURATION = 0.5
 
 def convert_video_to_audio(input_file: str) -> str:
     os.makedirs(AUDIO_DIR, exist_ok=True)
@@ -36,12 +41,44 @@ def convert_video_to_audio(input_file: str) -> str:
 
     return audio_file
 
-def split_audio(audio_file: str, target_duration: int = 20*60, window: int = 60) -> List[Tuple[float, float]]:
+def raw_audio_path(audio_file: str) -> str:
+    return os.path.splitext(audio_file)[0] + f'_{SAMPLE_RATE}.f32'
+
+def remove_audio_array(audio_file: str):
+    """Delete the decoded PCM file behind load_audio_array, once no array mapped from it is in use"""
+    raw_file = raw_audio_path(audio_file)
+    try:
+        if os.path.exists(raw_file):
+            os.remove(raw_file)
+    except OSError as e:
+        # Windows refuses while a mapping is still alive, the file is replaced on the next decode anyway
+        print(f"⚠️ Could not remove <{raw_file}>: {e}")
+
+def load_audio_array(audio_file: str) -> np.ndarray:
+    """Decode audio_file once to 16 kHz mono float32 and map it into memory, slices of it are views"""
+    raw_file = raw_audio_path(audio_file)
+    if not os.path.exists(raw_file) or os.path.getmtime(raw_file) < os.path.getmtime(audio_file):
+        print(f"🎵 Decoding <{audio_file}> to {SAMPLE_RATE} Hz PCM...")
+        ffmpeg_cmd = ['ffmpeg', '-y', '-nostdin', '-i', audio_file, '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+                      '-f', 'f32le', '-acodec', 'pcm_f32le', raw_file + '.part']
+        subprocess.run(ffmpeg_cmd, check=True, capture_output=True)
+        os.replace(raw_file + '.part', raw_file)
+    # copy-on-write keeps the array writable for torch.from_numpy without touching the file
+    return np.memmap(raw_file, dtype=np.float32, mode='c')
+
+def detect_silence_ends(audio: np.ndarray, offset: float = 0) -> List[float]:
+    """End times (s) of silent runs, equivalent to the silence_end lines of ffmpeg silencedetect"""
+    quiet = np.abs(audio) < 10 ** (SILENCE_THRESHOLD_DB / 20)
+    edges = np.flatnonzero(np.diff(quiet.view(np.int8), prepend=0, append=0))
+    run_starts, run_ends = edges[0::2], edges[1::2]
+    long_runs = run_ends - run_starts >= int(SILENCE_MIN_DURATION * SAMPLE_RATE)
+    return [float(offset + end / SAMPLE_RATE) for end in run_ends[long_runs]]
+
+def split_audio(audio_file: str, target_duration: int = 20*60, window: int = 60, audio: np.ndarray = None) -> List[Tuple[float, float]]:
     print("🔪 Splitting audio into segments...")
-    
-    # Use moviepy to get audio duration
-    with AudioFileClip(audio_file) as audio:
-        duration = audio.duration
+    if audio is None:
+        audio = load_audio_array(audio_file)
+    duration = len(audio) / SAMPLE_RATE
     
     segments = []
     start = 0
@@ -54,43 +91,11 @@ def split_audio(audio_file: str, target_duration: int = 20*60, window: int = 60)
         # Analyze audio in the 2-minute window
         window_start = start + target_duration - window
         window_end = min(window_start + 2 * window, duration)
-        
-        try:
-            ffmpeg_cmd = ['ffmpeg', '-y', '-i', audio_file, '-ss', str(window_start), 
-                         '-to', str(window_end), '-af', 'silencedetect=n=-30dB:d=0.5', 
-                         '-f', 'null', '-']
-            # Explicitly specify encoding as utf-8
-            process = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, 
-                                  encoding='utf-8', errors='replace')
-            output = process.stderr
-            
-            if output is None:
-                raise Exception("FFmpeg command failed to produce output")
-            
-            # Parse silence detection output
-            silence_times = []
-            for line in output.split('\n'):
-                if 'silence_end' in line:
-                    try:
-                        time_str = line.split('silence_end: ')[1].split(' ')[0]
-                        silence_times.append(float(time_str))
-                    except (IndexError, ValueError) as e:
-                        print(f"Warning: Failed to parse line: {line}, Error: {e}")
-                        continue
-            
-        except Exception as e:
-            print(f"Warning: Error during silence detection: {e}")
-            segments.append((start, start + target_duration))
-            start += target_duration
-            continue
+        silence_times = detect_silence_ends(audio[int(window_start * SAMPLE_RATE):int(window_end * SAMPLE_RATE)], window_start)
         
         if silence_times:
-            # Convert absolute times to relative times (relative to window_start)
-            relative_silence_times = [t - window_start for t in silence_times]
             # Find the first silence after the target duration (relative to segment start)
-            target_relative = target_duration - (window_start - start)
-            split_point = next((t + window_start for t, rel_t in zip(silence_times, relative_silence_times) 
-                              if rel_t > target_relative), None)
+            split_point = next((t for t in silence_times if t - start > target_duration), None)
             if split_point:
                 segments.append((start, split_point))
                 start = split_point
@@ -207,9 +212,6 @@ def process_transcription(result: Dict) -> pd.DataFrame:
     return pd.DataFrame(all_words)
 
 def save_results(df: pd.DataFrame):
-    os.makedirs('output/log', exist_ok=True)
-    excel_path = os.path.join('output/log', "cleaned_chunks.xlsx")
-    
     # Remove rows where 'text' is empty
     initial_rows = len(df)
     df = df[df['text'].str.len() > 0]
@@ -224,14 +226,14 @@ def save_results(df: pd.DataFrame):
         df = df[df['text'].str.len() <= 20]
     
     df['text'] = df['text'].apply(lambda x: f'"{x}"')
-    df.to_excel(excel_path, index=False)
-    print(f"📊 Excel file saved to {excel_path}")
+    saved_path = save_artifact(df, 'cleaned_chunks')
+    print(f"📊 Transcription saved to {saved_path}")
 
 def save_language(language: str):
     update_key("whisper.detected_language", language)
 
 def transcribe(video_file: str):
-    if os.path.exists("output/log/cleaned_chunks.xlsx"):
+    if artifact_exists('cleaned_chunks'):
         print("📊 Transcription results already exist, skipping transcription step.")
         return
     
@@ -246,6 +248,7 @@ def transcribe(video_file: str):
 
     # step2 Extract audio
     segments = split_audio(audio_file)
+    remove_audio_array(audio_file)
     
     # step3 Transcribe audio
     all_results = []
@@ -0,0 +1,107 @@
+import os, sys
+import time
+import random
+from collections import deque
+from threading import Lock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Health of every configured api over a sliding window, used by ask_gpt to decide the order apis are tried in.
+# Apis with a `weight` in config.yaml share the load in proportion to weight, scaled down by their recent
+# error rate and latency; apis without one stay plain fallbacks in config order. An api that answers 429 or
+# keeps failing cools down and is tried last until the cooldown ends, so every api is still tried before giving up.
+HEALTH_WINDOW = 120  # seconds of history kept per api
+MIN_SAMPLES = 4  # below this, error rate and latency are not trusted yet
+UNHEALTHY_ERROR_RATE = 0.5
+ERROR_COOLDOWN = 30
+RATE_LIMIT_COOLDOWN = 5  # doubled for every 429 in a row
+MAX_COOLDOWN = 120
+
+_health = {}
+_health_lock = Lock()
+
+def _get_health(api_name):
+    if api_name not in _health:
+        _health[api_name] = {'events': deque(), 'cooldown_until': 0, 'rate_limited_streak': 0}
+    return _health[api_name]
+
+def _prune(health, now):
+    events = health['events']
+    while events and events[0][0] < now - HEALTH_WINDOW:
+        events.popleft()
+
+def is_rate_limited(error):
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError'
+
+def _retry_after(error):
+    """Seconds from a Retry-After header, if the provider sent one"""
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def record_success(api_name, latency):
+    now = time.monotonic()
+    with _health_lock:
+        health = _get_health(api_name)
+        health['events'].append((now, latency, True))
+        health['rate_limited_streak'] = 0
+        _prune(health, now)
+
+def record_failure(api_name, error, latency):
+    now = time.monotonic()
+    with _health_lock:
+        health = _get_health(api_name)
+        health['events'].append((now, latency, False))
+        _prune(health, now)
+        if is_rate_limited(error):
+            health['rate_limited_streak'] += 1
+            backoff = _retry_after(error) or RATE_LIMIT_COOLDOWN * 2 ** (health['rate_limited_streak'] - 1)
+            health['cooldown_until'] = max(health['cooldown_until'], now + min(backoff, MAX_COOLDOWN))
+            return
+        events = health['events']
+        errors = sum(1 for _, _, ok in events if not ok)
+        if len(events) >= MIN_SAMPLES and errors / len(events) >= UNHEALTHY_ERROR_RATE:
+            health['cooldown_until'] = max(health['cooldown_until'], now + ERROR_COOLDOWN)
+
+def get_api_stats(api_name):
+    """(error rate, mean latency of successful calls) over the window, None where there is too little data"""
+    with _health_lock:
+        health = _get_health(api_name)
+        _prune(health, time.monotonic())
+        events = list(health['events'])
+    if len(events) < MIN_SAMPLES:
+        return None, None
+    latencies = [latency for _, latency, ok in events if ok]
+    error_rate = 1 - len(latencies) / len(events)
+    return error_rate, (sum(latencies) / len(latencies) if latencies else None)
+
+def order_apis(apis):
+    """[(api_name, api_config)] in the order ask_gpt should try them for one request"""
+    now = time.monotonic()
+    with _health_lock:
+        cooldowns = {api_name: _get_health(api_name)['cooldown_until'] for api_name in apis}
+    healthy = [(name, config) for name, config in apis.items() if cooldowns[name] <= now]
+    cooling = sorted(((name, config) for name, config in apis.items() if cooldowns[name] > now), key=lambda item: cooldowns[item[0]])
+
+    weighted = [(name, config) for name, config in healthy if float(config.get('weight') or 0) > 0]
+    fallbacks = [(name, config) for name, config in healthy if float(config.get('weight') or 0) <= 0]
+
+    scores = {}
+    stats = {name: get_api_stats(name) for name, _ in weighted}
+    known_latencies = [latency for _, latency in stats.values() if latency]
+    fastest = min(known_latencies) if known_latencies else None
+    for name, config in weighted:
+        error_rate, latency = stats[name]
+        score = float(config['weight']) * (1 - (error_rate or 0))
+        if fastest and latency:
+            score *= fastest / latency
+        scores[name] = max(score, 1e-6)
+
+    # weighted sampling without replacement: the first pick takes its share of the traffic, the rest are its fallbacks
+    ordered = []
+    while weighted:
+        pick = random.choices(range(len(weighted)), weights=[scores[name] for name, _ in weighted])[0]
+        ordered.append(weighted.pop(pick))
+
+    return ordered + fallbacks + cooling
@@ -0,0 +1,65 @@
+import os, sys
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.config_utils import load_key
+
+# Tables handed from one step to the next, name -> path without extension
+ARTIFACTS = {
+    'cleaned_chunks': 'output/log/cleaned_chunks',
+    'translation_results': 'output/log/translation_results',
+    'translation_results_for_subtitles': 'output/log/translation_results_for_subtitles',
+    'sovits_tasks': 'output/audio/sovits_tasks',
+}
+
+def _write_xlsx(df, path):
+    df.to_excel(path, index=False)
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+def _write_pickle(df, path):
+    df.to_pickle(path)
+
+# format -> (extension, reader, writer). xlsx stays readable so runs started before the switch can resume
+FORMATS = {
+    'parquet': ('.parquet', pd.read_parquet, _write_parquet),
+    'pickle': ('.pkl', pd.read_pickle, _write_pickle),
+    'xlsx': ('.xlsx', pd.read_excel, _write_xlsx),
+}
+
+def get_format():
+    fmt = load_key("artifacts.format", default='parquet')
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported artifact format: {fmt}, choose from {list(FORMATS)}")
+    return fmt
+
+def artifact_path(name, fmt=None):
+    return ARTIFACTS[name] + FORMATS[fmt or get_format()][0]
+
+def _existing_path(name):
+    """Path of the stored artifact, preferring the configured format"""
+    fmt = get_format()
+    for candidate in [fmt] + [f for f in FORMATS if f != fmt]:
+        path = artifact_path(name, candidate)
+        if os.path.exists(path):
+            return path, candidate
+    return None, None
+
+def artifact_exists(name):
+    return _existing_path(name)[0] is not None
+
+def load_artifact(name) -> pd.DataFrame:
+    path, fmt = _existing_path(name)
+    if path is None:
+        raise FileNotFoundError(f"Artifact `{name}` not found, expected {artifact_path(name)}")
+    return FORMATS[fmt][1](path)
+
+def save_artifact(df: pd.DataFrame, name):
+    fmt = get_format()
+    path = artifact_path(name, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    FORMATS[fmt][2](df, path)
+    # optional human readable copy, only read back when no columnar file exists
+    if fmt != 'xlsx' and load_key("artifacts.export_xlsx", default=False):
+        _write_xlsx(df, artifact_path(name, 'xlsx'))
+    return path
@@ -1,15 +1,29 @@
 import os, sys, json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from threading import Lock
+import asyncio
+import weakref
+import re
 import json_repair
 import json 
-from openai import OpenAI
+import textwrap
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 import time
 from requests.exceptions import RequestException
 from core.config_utils import load_key
+from core.gpt_cache import cache_key, get_cached_response, save_cached_response
+from core.api_router import order_apis, record_success, record_failure
 
 LOG_FOLDER = 'output/gpt_log'
 LOCK = Lock()
+CLIENTS_LOCK = Lock()
+_clients = {}
+INVALID_RESPONSE = object()  # handle_response: this api's answer was unusable, try the next one
+USAGE_LOCK = Lock()
+_usage = {}  # token usage reported by the apis, by log_title
+STREAM_RETRIES = 2
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff66-\uff9f]')
 
 def save_log(model, prompt, response, log_title = 'default', message = None):
     os.makedirs(LOG_FOLDER, exist_ok=True)
@@ -20,42 +34,219 @@ def save_log(model, prompt, response, log_title = 'default', message = None):
         "message": message
     }
     log_file = os.path.join(LOG_FOLDER, f"{log_title}.json")
-    
-    if os.path.exists(log_file):
-        with open(log_file, 'r', encoding='utf-8') as f:
-            logs = json.load(f)
-    else:
-        logs = []
-    logs.append(log_data)
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump(logs, f, ensure_ascii=False, indent=4)
+    entry = textwrap.indent(json.dumps(log_data, ensure_ascii=False, indent=4), ' ' * 4)
+
+    with LOCK:
+        if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
+            # append in place: replace the closing bracket instead of rewriting the whole list
+            with open(log_file, 'rb+') as f:
+                f.seek(max(0, f.seek(0, os.SEEK_END) - 64))
+                tail = f.read()
+                if b']' in tail:
+                    close_pos = f.tell() - len(tail) + tail.rindex(b']')
+                    is_empty_list = tail[:tail.rindex(b']')].rstrip().endswith(b'[')
+                    f.seek(close_pos)
+                    f.truncate()
+                    f.write((('\n' if is_empty_list else ',\n') + entry + '\n]').encode('utf-8'))
+                    return
+            # truncated or hand-edited log without a closing bracket, start it over
+            print(f"⚠️ Log file {log_file} is damaged, rewriting it")
+        with open(log_file, 'w', encoding='utf-8') as f:
+            f.write('[\n' + entry + '\n]')
+
+def get_client(api_config):
+    """Reuse one OpenAI client per (base_url, key) so worker threads share its keep-alive connection pool"""
+    client_key = (api_config.get("base_url"), api_config.get("key"))
+    client = _clients.get(client_key)
+    if client is None:
+        with CLIENTS_LOCK:
+            client = _clients.get(client_key)
+            if client is None:
+                pool_size = max(int(load_key("max_workers")), 1)
+                client = OpenAI(
+                    api_key=api_config.get("key"),
+                    base_url=api_config.get("base_url"),
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                    )
+                )
+                _clients[client_key] = client
+    return client
+
+def get_response_format(api_config, response_json):
+    return {"type": "json_object"} if response_json and api_config.get("model") in load_key("llm_support_json") else None
+
+def check_ask_gpt_history(prompt, apis, response_json):
+    # check if the prompt has been asked before with any of the configured models
+    for api_config in apis.values():
+        model = api_config.get("model")
+        if not model:
+            continue
+        history_response = get_cached_response(cache_key(model, prompt, get_response_format(api_config, response_json)))
+        if history_response is not None:
+            return history_response
+    return False
+
+def record_usage(log_title, usage):
+    if usage is None:
+        return
+    with USAGE_LOCK:
+        stats = _usage.setdefault(log_title, {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+        stats['requests'] += 1
+        stats['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+        stats['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+
+def get_usage_stats(reset=False):
+    """{log_title: {requests, prompt_tokens, completion_tokens}} since start or the last reset"""
+    with USAGE_LOCK:
+        stats = {title: dict(values) for title, values in _usage.items()}
+        if reset:
+            _usage.clear()
+    return stats
+
+def estimate_tokens(text):
+    """Rough BPE estimate: CJK characters are about one token each, other text about 4 characters per token"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def handle_response(api_name, api_config, prompt, content, response_json, response_format, valid_def, log_title):
+    """Parse, validate, log and cache one completion. Returns (result, error), result is INVALID_RESPONSE to try the next api"""
+    if not response_json:
+        return content, None
+    try:
+        response_data = json_repair.loads(content)
         
-def check_ask_gpt_history(prompt, model, log_title):
-    # check if the prompt has been asked before
-    if not os.path.exists(LOG_FOLDER):
+        # 如果定义了验证函数，进行验证
+        if valid_def:
+            valid_response = valid_def(response_data)
+            if valid_response['status'] != 'success':
+                save_log(
+                    api_config.get("model"), 
+                    prompt, 
+                    response_data, 
+                    log_title="error", 
+                    message=valid_response['message']
+                )
+                # 如果验证失败，继续尝试下一个 API
+                return INVALID_RESPONSE, None
+        
+        # 成功获取并验证响应，保存日志和缓存并返回
+        if log_title != 'None':
+            save_log(
+                api_config.get("model"), 
+                prompt, 
+                response_data, 
+                log_title=log_title
+            )
+            save_cached_response(
+                cache_key(api_config.get("model"), prompt, response_format),
+                api_config.get("model"),
+                response_data
+            )
+        
+        return response_data, None
+    
+    except Exception as e:
+        # JSON 解析或验证失败
+        print(f"❎ Error parsing response from {api_name}: {e}")
+        save_log(
+            api_config.get("model"), 
+            prompt, 
+            str(e), 
+            log_title="error", 
+            message="JSON parsing or validation failed"
+        )
+        return INVALID_RESPONSE, e
+
+class JsonKeyScanner:
+    """Collects the top-level keys of a JSON object while it is still being streamed"""
+    def __init__(self):
+        self.keys = []
+        self.depth = 0
+        self.in_string = self.escape = self.capturing = self.expect_key = False
+        self.buffer = []
+
+    def feed(self, text):
+        """Returns True when the text completed at least one new top-level key"""
+        found = False
+        for char in text:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.capturing:
+                        self.keys.append(''.join(self.buffer))
+                        self.expect_key = False
+                        found = True
+                    continue
+                if self.capturing:
+                    self.buffer.append(char)
+            elif char == '"':
+                self.in_string = True
+                self.capturing = self.depth == 1 and self.expect_key
+                self.buffer = []
+            elif char in '{[':
+                self.depth += 1
+                if self.depth == 1:
+                    self.expect_key = char == '{'
+            elif char in '}]':
+                self.depth -= 1
+            elif char == ',' and self.depth == 1:
+                self.expect_key = True
+        return found
+
+def stream_completion(client, api_config, messages, response_format, partial_valid_def):
+    """
+    Stream one completion and check its top-level keys with partial_valid_def as they arrive.
+    Returns (content, None), or (content so far, error message) when the answer was abandoned early.
+    """
+    stream = client.chat.completions.create(
+        model=api_config.get("model"),
+        messages=messages,
+        response_format=response_format,
+        timeout=150,
+        stream=True
+    )
+    scanner = JsonKeyScanner()
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            parts.append(chunk.choices[0].delta.content)
+            if scanner.feed(parts[-1]):
+                valid_response = partial_valid_def(scanner.keys)
+                if valid_response['status'] != 'success':
+                    return ''.join(parts), valid_response['message']
+    finally:
+        stream.close()
+    return ''.join(parts), None
+
+def is_complete_api(api_name, api_config):
+    # 如果 API 配置不完整，跳过
+    if not api_config.get("key") or not api_config.get("base_url") or not api_config.get("model"):
+        print(f"Skipping incomplete API configuration: {api_name}")
         return False
-    file_path = os.path.join(LOG_FOLDER, f"{log_title}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            for item in data:
-                if item["prompt"] == prompt and item["model"] == model:
-                    return item["response"]
-    return False
+    return True
 
-def ask_gpt(prompt, response_json=True, valid_def=None, log_title='default', re_try=False, **kwargs):
+def ask_gpt(prompt, response_json=True, valid_def=None, log_title='default', re_try=False, partial_valid_def=None, **kwargs):
+    """
+    partial_valid_def(keys) checks the top-level keys of an answer that is still streaming. With `llm_stream` enabled,
+    a violating answer is abandoned right away and asked again, up to STREAM_RETRIES times per api.
+    """
     # 获取所有 API 配置
     apis = load_key("apis")
-    llm_support_json = load_key("llm_support_json")
     
-    with LOCK:
-        # 如果 re_try 为 False，则检查历史记录
-        if not re_try:
-            # 使用第一个 API 的模型检查历史记录
-            first_api = apis.get("api1", {})
-            history_response = check_ask_gpt_history(prompt, first_api.get("model", ""), log_title)
-            if history_response:
-                return history_response
+    # 如果 re_try 为 False，则检查历史记录
+    if not re_try and apis:
+        history_response = check_ask_gpt_history(prompt, apis, response_json)
+        if history_response:
+            return history_response
     
     # 如果没有 API 配置，抛出异常
     if not apis:
@@ -65,81 +256,58 @@ def ask_gpt(prompt, response_json=True, valid_def=None, log_title='default', re_
     
     # 存储最后一次的异常，以便在所有 API 都失败时抛出
     last_exception = None
+    stream = partial_valid_def is not None and load_key("llm_stream", default=False)
     
-    # 遍历所有 API 配置
-    for api_name, api_config in apis.items():
-        # 如果 API 配置不完整，跳过
-        if not api_config.get("key") or not api_config.get("base_url") or not api_config.get("model"):
-            print(f"Skipping incomplete API configuration: {api_name}")
+    # 按健康状况和权重排序后遍历所有 API 配置
+    for api_name, api_config in order_apis(apis):
+        if not is_complete_api(api_name, api_config):
             continue
         
+        started = time.monotonic()
         try:
-            # 使用当前 API 配置
-            client = OpenAI(
-                api_key=api_config.get("key"), 
-                base_url=api_config.get("base_url")
-            )
+            # 使用当前 API 配置（复用连接池）
+            client = get_client(api_config)
             
             # 确定是否使用 JSON 响应格式
-            response_format = {"type": "json_object"} if response_json and api_config.get("model") in llm_support_json else None
+            response_format = get_response_format(api_config, response_json)
             
-            # 尝试获取响应
-            response = client.chat.completions.create(
-                model=api_config.get("model"),
-                messages=messages,
-                response_format=response_format,
-                timeout=150
-            )
-            
-            # 解析响应
-            if response_json:
-                try:
-                    response_data = json_repair.loads(response.choices[0].message.content)
-                    
-                    # 如果定义了验证函数，进行验证
-                    if valid_def:
-                        valid_response = valid_def(response_data)
-                        if valid_response['status'] != 'success':
-                            save_log(
-                                api_config.get("model"), 
-                                prompt, 
-                                response_data, 
-                                log_title="error", 
-                                message=valid_response['message']
-                            )
-                            # 如果验证失败，继续尝试下一个 API
-                            continue
-                    
-                    # 成功获取并验证响应，保存日志并返回
-                    with LOCK:
-                        if log_title != 'None':
-                            save_log(
-                                api_config.get("model"), 
-                                prompt, 
-                                response_data, 
-                                log_title=log_title
-                            )
-                    
-                    return response_data
-                
-                except Exception as e:
-                    # JSON 解析或验证失败
-                    print(f"❎ Error parsing response from {api_name}: {e}")
-                    save_log(
-                        api_config.get("model"), 
-                        prompt, 
-                        str(e), 
-                        log_title="error", 
-                        message="JSON parsing or validation failed"
-                    )
-                    last_exception = e
-                    continue
-        
+            if stream:
+                # 流式获取响应，结构不符时立即中止并重试
+                for attempt in range(STREAM_RETRIES + 1):
+                    content, abort_message = stream_completion(client, api_config, messages, response_format, partial_valid_def)
+                    if abort_message is None:
+                        break
+                    print(f"❎ Aborted streaming answer from {api_name} ({abort_message}), attempt {attempt + 1}")
+                    save_log(api_config.get("model"), prompt, content, log_title="error", message=f"Aborted while streaming: {abort_message}")
+            else:
+                # 尝试获取响应
+                response = client.chat.completions.create(
+                    model=api_config.get("model"),
+                    messages=messages,
+                    response_format=response_format,
+                    timeout=150
+                )
+                content = response.choices[0].message.content
         except Exception as e:
             # API 调用失败
             print(f"❎ Error with API {api_name}: {e}")
+            record_failure(api_name, e, time.monotonic() - started)
             last_exception = e
             continue
+        if stream and abort_message is not None:
+            # 重试次数用完，记为失败并换下一个 API
+            last_exception = ValueError(abort_message)
+            record_failure(api_name, last_exception, time.monotonic() - started)
+            continue
+        record_success(api_name, time.monotonic() - started)
+        if not stream:
+            record_usage(log_title, response.usage)
+        
+        result, error = handle_response(api_name, api_config, prompt, content, response_json, response_format, valid_def, log_title)
+        if result is INVALID_RESPONSE:
+            last_exception = error or last_exception
+            continue
+        return result
     
     # 如果所有 API 都失败，抛出最后一个异常
     if last_exception:
@@ -148,6 +316,161 @@ def ask_gpt(prompt, response_json=True, valid_def=None, log_title='default', re_
     # 如果没有任何可用的 API 配置
     raise ValueError("No valid API configurations found")
 
+# ------------
+# async path: one event loop drives many in-flight requests instead of one thread per request
+# ------------
+
+class AsyncRateLimiter:
+    """Token buckets for the requests per minute and tokens per minute of one api"""
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests, self.tokens = rpm or 0, tpm or 0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        # waiters queue on the lock, so requests are released in arrival order
+        async with self.lock:
+            if self.tpm:
+                tokens = min(tokens, self.tpm)  # a request bigger than the bucket would never fit
+            while True:
+                self._refill()
+                waits = []
+                if self.rpm and self.requests < 1:
+                    waits.append((1 - self.requests) * 60 / self.rpm)
+                if self.tpm and self.tokens < tokens:
+                    waits.append((tokens - self.tokens) * 60 / self.tpm)
+                if not waits:
+                    break
+                await asyncio.sleep(max(waits))
+            if self.rpm:
+                self.requests -= 1
+            if self.tpm:
+                self.tokens -= tokens
+
+    def settle(self, estimated, actual):
+        """Charge the difference once the real usage of a request is known"""
+        if self.tpm and actual:
+            self.tokens -= actual - estimated
+
+# per event loop: clients and locks cannot be shared across loops
+_async_states = weakref.WeakKeyDictionary()
+
+def get_async_state():
+    loop = asyncio.get_running_loop()
+    state = _async_states.get(loop)
+    if state is None:
+        concurrency = max(int(load_key("llm_max_concurrency", default=load_key("max_workers"))), 1)
+        state = {'semaphore': asyncio.Semaphore(concurrency), 'clients': {}, 'limiters': {}}
+        _async_states[loop] = state
+    return state
+
+def get_async_client(api_config):
+    clients = get_async_state()['clients']
+    client_key = (api_config.get("base_url"), api_config.get("key"))
+    if client_key not in clients:
+        pool_size = max(int(load_key("llm_max_concurrency", default=load_key("max_workers"))), 1)
+        clients[client_key] = AsyncOpenAI(
+            api_key=api_config.get("key"),
+            base_url=api_config.get("base_url"),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+        )
+    return clients[client_key]
+
+def get_rate_limiter(api_name, api_config):
+    limiters = get_async_state()['limiters']
+    if api_name not in limiters:
+        limiters[api_name] = AsyncRateLimiter(api_config.get("rpm"), api_config.get("tpm"))
+    return limiters[api_name]
+
+async def close_async_clients():
+    state = _async_states.get(asyncio.get_running_loop())
+    if state:
+        for client in state['clients'].values():
+            await client.close()
+        state['clients'].clear()
+
+async def ask_gpt_async(prompt, response_json=True, valid_def=None, log_title='default', re_try=False, **kwargs):
+    """Same contract as ask_gpt, bounded by llm_max_concurrency and the optional rpm/tpm of each api"""
+    apis = load_key("apis")
+    
+    if not re_try and apis:
+        history_response = check_ask_gpt_history(prompt, apis, response_json)
+        if history_response:
+            return history_response
+    
+    if not apis:
+        raise ValueError("⚠️No API configurations found")
+    
+    messages = [{"role": "user", "content": prompt}]
+    semaphore = get_async_state()['semaphore']
+    last_exception = None
+    
+    for api_name, api_config in order_apis(apis):
+        if not is_complete_api(api_name, api_config):
+            continue
+        
+        response_format = get_response_format(api_config, response_json)
+        # prompt tokens plus a completion of similar size, settled against the real usage afterwards
+        estimated_tokens = 2 * estimate_tokens(prompt)
+        limiter = get_rate_limiter(api_name, api_config)
+        try:
+            async with semaphore:
+                await limiter.acquire(estimated_tokens)
+                started = time.monotonic()
+                try:
+                    response = await get_async_client(api_config).chat.completions.create(
+                        model=api_config.get("model"),
+                        messages=messages,
+                        response_format=response_format,
+                        timeout=150
+                    )
+                except Exception as e:
+                    record_failure(api_name, e, time.monotonic() - started)
+                    raise
+                record_success(api_name, time.monotonic() - started)
+            limiter.settle(estimated_tokens, getattr(response.usage, 'total_tokens', None))
+            record_usage(log_title, response.usage)
+        except Exception as e:
+            print(f"❎ Error with API {api_name}: {e}")
+            last_exception = e
+            continue
+        
+        result, error = handle_response(api_name, api_config, prompt, response.choices[0].message.content, response_json, response_format, valid_def, log_title)
+        if result is INVALID_RESPONSE:
+            last_exception = error or last_exception
+            continue
+        return result
+    
+    if last_exception:
+        raise Exception(f"Failed after trying all API configurations: {last_exception}")
+    raise ValueError("No valid API configurations found")
+
+def ask_gpt_batch(requests):
+    """
+    Run many ask_gpt calls from synchronous code on one event loop.
+    requests: list of dicts of ask_gpt keyword arguments (prompt, valid_def, log_title, ...).
+    Returns the results in order, a failed request gives its exception instead of a result.
+    """
+    async def run_all():
+        try:
+            return await asyncio.gather(*(ask_gpt_async(**request) for request in requests), return_exceptions=True)
+        finally:
+            await close_async_clients()
+    if not requests:
+        return []
+    return asyncio.run(run_all())
+
 
 if __name__ == '__main__':
     print(ask_gpt('hi there hey response in json format, just return 200.' , response_json=True, log_title=None))
@@ -1,6 +1,7 @@
 from ruamel.yaml import YAML
 from typing import Any
 import os, sys
+import copy
 import threading
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -11,24 +12,48 @@ config_lock = threading.Lock()
 yaml = YAML()
 yaml.preserve_quotes = True
 
-def load_key(key: str) -> Any:
-    with config_lock:
+# parsed config.yaml, re-parsed only when the file changes on disk or via update_key
+_config_cache = {'stamp': None, 'data': None}
+_cache_stats = {'hits': 0, 'misses': 0}
+_MISSING = object()
+
+def _load_config():
+    # caller must hold config_lock
+    stat = os.stat(CONFIG_PATH)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if _config_cache['data'] is not None and _config_cache['stamp'] == stamp:
+        _cache_stats['hits'] += 1
+    else:
+        _cache_stats['misses'] += 1
         with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
-            data = yaml.load(file)
+            _config_cache['data'] = yaml.load(file)
+        _config_cache['stamp'] = stamp
+    return _config_cache['data']
 
-    keys = key.split('.')
-    value = data
-    for k in keys:
-        if isinstance(value, dict) and k in value:
-            value = value[k]
-        else:
-            raise KeyError(f"Key '{k}' not found in configuration")
-    return value
+def get_config_cache_stats() -> dict:
+    with config_lock:
+        return dict(_cache_stats)
+
+def load_key(key: str, default: Any = _MISSING) -> Any:
+    with config_lock:
+        data = _load_config()
+
+        keys = key.split('.')
+        value = data
+        for k in keys:
+            if isinstance(value, dict) and k in value:
+                value = value[k]
+            elif default is not _MISSING:
+                # optional settings that older config.yaml files may not have yet
+                return default
+            else:
+                raise KeyError(f"Key '{k}' not found in configuration")
+        # callers may modify dicts/lists (e.g. `apis` in the sidebar), never hand out the cached objects
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
 
 def update_key(key: str, new_value: Any) -> bool:
     with config_lock:
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
-            data = yaml.load(file)
+        data = _load_config()
 
         keys = key.split('.')
         current = data
@@ -40,8 +65,11 @@ def update_key(key: str, new_value: Any) -> bool:
 
         if isinstance(current, dict) and keys[-1] in current:
             current[keys[-1]] = new_value
-            with open(CONFIG_PATH, 'w', encoding='utf-8') as file:
-                yaml.dump(data, file)
+            try:
+                with open(CONFIG_PATH, 'w', encoding='utf-8') as file:
+                    yaml.dump(data, file)
+            finally:
+                _config_cache['data'] = None
             return True
         else:
             raise KeyError(f"Key '{keys[-1]}' not found in configuration")
@@ -0,0 +1,58 @@
+import os, sys, json
+import hashlib
+from threading import Lock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Shared LLM response cache for translate / split / align / trim callers.
+# Records are appended to a JSON-lines file, lookups go through an in-memory index.
+CACHE_FILE = 'output/gpt_log/cache.jsonl'
+
+_index = {}
+_file_state = {'ino': None, 'size': 0}  # the part of CACHE_FILE already loaded into _index
+_cache_lock = Lock()
+
+def cache_key(model, prompt, response_format=None):
+    raw = json.dumps([model, prompt, response_format], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _sync_index():
+    """Load records appended since the last sync, reset when the file was moved away (e.g. by onekeycleanup)"""
+    try:
+        stat = os.stat(CACHE_FILE)
+    except OSError:
+        _index.clear()
+        _file_state.update(ino=None, size=0)
+        return
+
+    if stat.st_ino != _file_state['ino'] or stat.st_size < _file_state['size']:
+        _index.clear()
+        _file_state.update(ino=stat.st_ino, size=0)
+    if stat.st_size == _file_state['size']:
+        return
+
+    with open(CACHE_FILE, 'rb') as f:
+        f.seek(_file_state['size'])
+        data = f.read()
+    # only consume complete lines, a half-written tail is picked up on the next sync
+    end = data.rfind(b'\n') + 1
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+            _index[record['key']] = record['response']
+        except (ValueError, KeyError):
+            continue
+    _file_state['size'] += end
+
+def get_cached_response(key):
+    with _cache_lock:
+        _sync_index()
+        return _index.get(key)
+
+def save_cached_response(key, model, response):
+    line = json.dumps({"key": key, "model": model, "response": response}, ensure_ascii=False) + '\n'
+    with _cache_lock:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        _sync_index()
+        with open(CACHE_FILE, 'ab') as f:
+            f.write(line.encode('utf-8'))
+        _sync_index()
@@ -239,6 +239,42 @@ Please complete the following JSON data, where << >> represents placeholders tha
 '''
     return prompt_expressiveness.strip()
 
+def get_prompt_one_shot(lines, shared_prompt):
+    TARGET_LANGUAGE = load_key("target_language")
+    json_format = {}
+    for i, line in enumerate(lines.split('\n'), 1):
+        json_format[i] = {
+            "origin": line,
+            "direct": f"<<direct {TARGET_LANGUAGE} translation>>",
+            "reflection": "<<reflection on the direct translation version>>",
+            "free": f"<<retranslated result, aiming for fluency and naturalness, conforming to {TARGET_LANGUAGE} expression habits, DO NOT leave empty line here!>>"
+        }
+
+    src_language = load_key("whisper.detected_language")
+    prompt_one_shot = f'''
+### Role Definition
+You are a professional Netflix subtitle translator and language consultant, fluent in both {src_language} and {TARGET_LANGUAGE}, as well as their respective cultures. You first translate faithfully, then refine the translation to suit {TARGET_LANGUAGE} expression habits.
+
+### Task Description
+Based on the provided original {src_language} subtitles, handle the text line by line in three steps:
+1. Direct Translation: translate the line faithfully into {TARGET_LANGUAGE}, accurately conveying the original meaning and terminology, without changing, adding, or omitting content
+2. Direct Translation Reflection: evaluate the fluency, the consistency of style with the original, and the conciseness of the direct translation, pointing out where it is too wordy
+3. {TARGET_LANGUAGE} Free Translation: based on the reflection, retranslate the line so it is smooth and natural for a {TARGET_LANGUAGE} audience, concise, plain in style, and close to the original in length and structure
+
+{shared_prompt}
+
+### Subtitle Data
+<subtitles>
+{lines}
+</subtitles>
+
+### Output Format
+Json Only: return only JSON data. Make sure to generate the correct Json format, don't output " in the value.
+Please complete the following JSON data, where << >> represents placeholders that should not appear in your answer:
+{json.dumps(json_format, ensure_ascii=False, indent=4)}
+'''
+    return prompt_one_shot.strip()
+
 
 ## ================================================================
 # @ step6_splitforsub.py
@@ -349,3 +385,43 @@ Please complete the following JSON data, where << >> represents content you need
         duration=duration,
         rule=rule
     )
+
+def get_subtitle_trim_batch_prompt(items):
+    """items: list of (subtitle, duration), answered as one JSON object keyed by the 1-based item number"""
+    rule = '''Consider a. Reducing filler words without modifying meaningful content. b. Omitting unnecessary modifiers or pronouns, for example:
+    - "Please explain your thought process" can be shortened to "Please explain thought process"
+    - "We need to carefully analyze this complex problem" can be shortened to "We need to analyze this problem"
+    - "Let's discuss the various different perspectives on this topic" can be shortened to "Let's discuss different perspectives on this topic"
+    - "Can you describe in detail your experience from yesterday" can be shortened to "Can you describe yesterday's experience" '''
+
+    subtitles = '\n'.join(f'{i}. Subtitle: "{text}" | Duration: {duration} seconds' for i, (text, duration) in enumerate(items, 1))
+    json_format = {
+        str(i): {
+            "analysis": "<<Brief analysis of the subtitle, including structure, key information, and potential processing locations>>",
+            "trans_text_processed": "<<Optimized and shortened subtitle in the original subtitle language>>"
+        } for i in range(1, len(items) + 1)
+    }
+
+    trim_prompt = f'''
+### Role
+You are a professional subtitle editor, editing and optimizing lengthy subtitles that exceed voiceover time before handing them to voice actors. Your expertise lies in cleverly shortening subtitles slightly while ensuring the original meaning and structure remain unchanged.
+
+### Subtitle Data
+Each numbered subtitle is independent and must fit its own duration:
+<subtitles>
+{subtitles}
+</subtitles>
+
+### Processing Rules
+{rule}
+
+### Processing Steps
+For every subtitle, follow these steps and provide the results in the JSON output:
+1. Analysis: Briefly analyze the subtitle's structure, key information, and filler words that can be omitted.
+2. Trimming: Based on the rules and analysis, optimize the subtitle by making it more concise according to the processing rules.
+
+### Output Format
+Please complete the following JSON data with one entry per subtitle number, where << >> represents content you need to fill in:
+{json.dumps(json_format, ensure_ascii=False, indent=4)}
+'''
+    return trim_prompt.strip()
@@ -0,0 +1,54 @@
+import os,sys
+from spacy.tokens import DocBin
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from core.config_utils import load_key
+from rich import print
+
+# Parsed Docs keyed by their exact text, one store per spaCy model.
+# The split passes and step3_2 look sentences up here, so every distinct text is parsed once,
+# and the store is written with DocBin so a resumed run does not parse again.
+DOC_STORE_DIR = 'output/log'
+PIPE_BATCH_SIZE = 256
+# the split passes only read tokens, POS, dependencies and sentence boundaries
+UNUSED_COMPONENTS = ['ner', 'entity_ruler', 'entity_linker', 'lemmatizer', 'textcat', 'textcat_multilabel', 'spancat']
+
+_stores = {}
+
+def _model_name(nlp):
+    return f"{nlp.meta['lang']}_{nlp.meta['name']}"
+
+def _store_file(nlp):
+    return os.path.join(DOC_STORE_DIR, f"spacy_docs_{_model_name(nlp)}.spacy")
+
+def _get_store(nlp):
+    name = _model_name(nlp)
+    if name not in _stores:
+        _stores[name] = {}
+        store_file = _store_file(nlp)
+        if os.path.exists(store_file):
+            for doc in DocBin().from_disk(store_file).get_docs(nlp.vocab):
+                _stores[name][doc.text] = doc
+            print(f"[blue]📂 Loaded {len(_stores[name])} parsed docs from `{store_file}`[/blue]")
+    return _stores[name]
+
+def parse_texts(texts, nlp):
+    """Docs for texts, parsing the ones not in the store with a single nlp.pipe run"""
+    store = _get_store(nlp)
+    missing = list(dict.fromkeys(text for text in texts if text not in store))
+    if missing:
+        batch_size = load_key("spacy.batch_size", default=PIPE_BATCH_SIZE)
+        # worker processes only pay off for large batches, single texts stay in process
+        n_process = load_key("spacy.n_process", default=1) if len(missing) > batch_size else 1
+        disable = [name for name in nlp.pipe_names if name in UNUSED_COMPONENTS]
+        for text, doc in zip(missing, nlp.pipe(missing, batch_size=batch_size, n_process=n_process, disable=disable)):
+            store[text] = doc
+    return [store[text] for text in texts]
+
+def get_doc(text, nlp):
+    return parse_texts([text], nlp)[0]
+
+def save_doc_store(nlp):
+    store = _get_store(nlp)
+    os.makedirs(DOC_STORE_DIR, exist_ok=True)
+    doc_bin = DocBin(docs=store.values())
+    doc_bin.to_disk(_store_file(nlp))
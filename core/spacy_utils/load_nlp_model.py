@@ -6,6 +6,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 from core.config_utils import load_key
 
 SPACY_MODEL_MAP = load_key("spacy_model_map")
+# loaded pipelines by model name, step3_1 and step3_2 share one instance per process
+_nlp_cache = {}
 
 def get_spacy_model(language: str):
     model = SPACY_MODEL_MAP.get(language.lower(), "en_core_web_md")
@@ -17,6 +19,8 @@ def init_nlp():
     try:
         language = "en" if load_key("whisper.language") == "en" else load_key("whisper.detected_language")
         model = get_spacy_model(language)
+        if model in _nlp_cache:
+            return _nlp_cache[model]
         print(f"[blue]⏳ Loading NLP Spacy model: <{model}> ...[/blue]")
         try:
             nlp = spacy.load(model)
@@ -28,4 +32,5 @@ def init_nlp():
     except:
         raise ValueError(f"❌ Failed to load NLP Spacy model: {model}")
     print(f"[green]✅ NLP Spacy model loaded successfully![/green]")
-    return nlp
\ No newline at end of file
+    _nlp_cache[model] = nlp
+    return nlp
@@ -2,8 +2,9 @@ import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 import itertools
 import os,sys
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from load_nlp_model import init_nlp
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from core.spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.doc_store import get_doc, parse_texts
 from rich import print
 
 def is_valid_phrase(phrase):
@@ -28,7 +29,7 @@ def analyze_comma(start, doc, token):
     return suitable_for_splitting
 
 def split_by_comma(text, nlp):
-    doc = nlp(text)
+    doc = get_doc(text, nlp)
     sentences = []
     start = 0
     
@@ -55,6 +56,8 @@ def split_by_comma_main(nlp):
     with open("output/log/sentence_by_mark.txt", "r", encoding="utf-8") as input_file:
         sentences = input_file.readlines()
 
+    # parse the whole pass in one batch, split_by_comma then reads from the doc store
+    parse_texts([sentence.strip() for sentence in sentences], nlp)
     all_split_sentences = []
     for sentence in sentences:
         split_sentences = split_by_comma(sentence.strip(), nlp)
@@ -1,8 +1,9 @@
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 import os,sys
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from load_nlp_model import init_nlp
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from core.spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.doc_store import parse_texts
 from rich import print
 
 def analyze_connectors(doc, token):
@@ -81,48 +82,53 @@ def analyze_connectors(doc, token):
     else:
         return True, False
 
-def split_by_connectors(text, context_words=5, nlp=None):
-    doc = nlp(text)
-    sentences = [doc.text]  # init
-    
-    while True:
-        # Handle each task with a single cut
-        # avoiding the fragmentation of a sentence into multiple parts at the same time.
-        split_occurred = False
-        new_sentences = []
+def split_at_first_connector(doc, context_words=5):
+    """Cut doc once, before the first connector with enough context on both sides"""
+    for i, token in enumerate(doc):
+        split_before, _ = analyze_connectors(doc, token)
         
-        for sent in sentences:
-            doc = nlp(sent)
-            start = 0
-            
-            for i, token in enumerate(doc):
-                split_before, _ = analyze_connectors(doc, token)
-                
-                if i + 1 < len(doc) and doc[i + 1].text in ["'s", "'re", "'ve", "'ll", "'d"]:
-                    continue
-                
-                left_words = doc[max(0, token.i - context_words):token.i]
-                right_words = doc[token.i+1:min(len(doc), token.i + context_words + 1)]
-                
-                left_words = [word.text for word in left_words if not word.is_punct]
-                right_words = [word.text for word in right_words if not word.is_punct]
-                
-                if len(left_words) >= context_words and len(right_words) >= context_words and split_before:
-                    print(f"[yellow]✂️  Split before '{token.text}': {' '.join(left_words)}| {token.text} {' '.join(right_words)}[/yellow]")
-                    new_sentences.append(doc[start:token.i].text.strip())
-                    start = token.i
-                    split_occurred = True
-                    break
-            
-            if start < len(doc):
-                new_sentences.append(doc[start:].text.strip())
+        if i + 1 < len(doc) and doc[i + 1].text in ["'s", "'re", "'ve", "'ll", "'d"]:
+            continue
         
-        if not split_occurred:
+        left_words = doc[max(0, token.i - context_words):token.i]
+        right_words = doc[token.i+1:min(len(doc), token.i + context_words + 1)]
+        
+        left_words = [word.text for word in left_words if not word.is_punct]
+        right_words = [word.text for word in right_words if not word.is_punct]
+        
+        if len(left_words) >= context_words and len(right_words) >= context_words and split_before:
+            print(f"[yellow]✂️  Split before '{token.text}': {' '.join(left_words)}| {token.text} {' '.join(right_words)}[/yellow]")
+            return [doc[:token.i].text.strip(), doc[token.i:].text.strip()]
+    return None
+
+def split_all_by_connectors(texts, context_words=5, nlp=None):
+    """
+    Split every text by connectors in rounds. Each round makes at most one cut per piece
+    (avoiding the fragmentation of a sentence into multiple parts at the same time),
+    and the new pieces of all texts are parsed together in one batch before the next round.
+    """
+    # per text, a list of [piece, done]
+    pieces = [[[text, False]] for text in texts]
+    while True:
+        pending = [piece for text_pieces in pieces for piece, done in text_pieces if not done]
+        if not pending:
             break
+        docs = dict(zip(pending, parse_texts(pending, nlp)))
         
-        sentences = new_sentences
+        for text_pieces in pieces:
+            new_pieces = []
+            for piece, done in text_pieces:
+                parts = None if done else split_at_first_connector(docs[piece], context_words)
+                if parts:
+                    new_pieces.extend([part, False] for part in parts)
+                else:
+                    new_pieces.append([piece, True])
+            text_pieces[:] = new_pieces
     
-    return sentences
+    return [[piece for piece, _ in text_pieces] for text_pieces in pieces]
+
+def split_by_connectors(text, context_words=5, nlp=None):
+    return split_all_by_connectors([text], context_words, nlp)[0]
 
 def split_sentences_main(nlp):
     # Read input sentences
@@ -130,9 +136,8 @@ def split_sentences_main(nlp):
         sentences = input_file.readlines()
     
     all_split_sentences = []
-    # Process each input sentence
-    for sentence in sentences:
-        split_sentences = split_by_connectors(sentence.strip(), nlp = nlp)
+    # Process all input sentences together, round by round
+    for split_sentences in split_all_by_connectors([sentence.strip() for sentence in sentences], nlp=nlp):
         all_split_sentences.extend(split_sentences)
     
     # output to sentence_splitbyconnector.txt
@@ -1,10 +1,11 @@
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 import os,sys
-import pandas as pd
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from core.spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.doc_store import get_doc
 from core.config_utils import load_key, get_joiner
+from core.artifact_store import load_artifact
 from rich import print
 
 def split_by_mark(nlp):
@@ -12,13 +13,13 @@ def split_by_mark(nlp):
     language = load_key("whisper.detected_language") if whisper_language == 'auto' else whisper_language # consider force english case
     joiner = get_joiner(language)
     print(f"[blue]🔍 Using {language} language joiner: '{joiner}'[/blue]")
-    chunks = pd.read_excel("output/log/cleaned_chunks.xlsx")
+    chunks = load_artifact('cleaned_chunks')
     chunks.text = chunks.text.apply(lambda x: x.strip('"'))
     
     # join with joiner
     input_text = joiner.join(chunks.text.to_list())
 
-    doc = nlp(input_text)
+    doc = get_doc(input_text, nlp)
     assert doc.has_annotation("SENT_START")
 
     sentences_by_mark = [sent.text for sent in doc.sents]
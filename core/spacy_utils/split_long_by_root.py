@@ -3,6 +3,7 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 import os,sys
 sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..', '..')))
 from core.spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.doc_store import get_doc, parse_texts
 from core.config_utils import load_key, get_joiner
 from rich import print
 import string
@@ -67,13 +68,16 @@ def split_long_by_root_main(nlp):
     with open("output/log/sentence_splitbyconnector.txt", "r", encoding="utf-8") as input_file:
         sentences = input_file.readlines()
 
+    docs = parse_texts([sentence.strip() for sentence in sentences], nlp)
+    long_splits = {i: split_long_sentence(doc) for i, doc in enumerate(docs) if len(doc) > 60}
+    # parse all the pieces of long sentences in one batch before checking their length
+    parse_texts([sent for split_sentences in long_splits.values() for sent in split_sentences], nlp)
     all_split_sentences = []
-    for sentence in sentences:
-        doc = nlp(sentence.strip())
-        if len(doc) > 60:
-            split_sentences = split_long_sentence(doc)
-            if any(len(nlp(sent)) > 60 for sent in split_sentences):
-                split_sentences = [subsent for sent in split_sentences for subsent in split_extremely_long_sentence(nlp(sent))]
+    for i, sentence in enumerate(sentences):
+        if i in long_splits:
+            split_sentences = long_splits[i]
+            if any(len(get_doc(sent, nlp)) > 60 for sent in split_sentences):
+                split_sentences = [subsent for sent in split_sentences for subsent in split_extremely_long_sentence(get_doc(sent, nlp))]
             all_split_sentences.extend(split_sentences)
             print(f"[yellow]✂️  Splitting long sentences by root: {sentence[:30]}...[/yellow]")
         else:
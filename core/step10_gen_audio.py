@@ -1,11 +1,12 @@
 import os, sys
-import pandas as pd
-from tqdm import tqdm
+import numpy as np
 import soundfile as sf
-import subprocess
+import random
+import concurrent.futures
 from rich import print as rprint
 from rich.panel import Panel
 from rich.console import Console
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn
 import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.all_tts_functions.gpt_sovits_tts import gpt_sovits_tts_for_videolingo
@@ -15,9 +16,23 @@ from core.all_tts_functions.azure_tts import azure_tts
 from core.prompts_storage import get_subtitle_trim_prompt
 from core.ask_gpt import ask_gpt
 from core.config_utils import load_key
+from core.artifact_store import load_artifact
 
 console = Console()
 
+# Concurrent TTS requests per backend, overridable with `tts_concurrency` in config.yaml
+# the local GPT-SoVITS server handles one request at a time (and chdirs on startup), so keep it serial
+TTS_CONCURRENCY = {
+    'openai_tts': 8,
+    'azure_tts': 4,
+    'fish_tts': 4,
+    'gpt_sovits': 1,
+}
+TTS_MAX_RETRIES = 3
+# WSOLA time-stretch: 40ms frames with 50% overlap, splice search within +/-10ms
+WSOLA_FRAME_SECONDS = 0.04
+WSOLA_TOLERANCE_SECONDS = 0.01
+
 def check_wav_duration(file_path):
     try:
         audio_info = sf.info(file_path)
@@ -47,6 +62,9 @@ def generate_audio(text, target_duration, save_as, number, task_df):
     MAX_SPEED_FACTOR = load_key("speed_factor.max")
     os.makedirs('output/audio/tmp', exist_ok=True)
     temp_filename = f"output/audio/tmp/{number}_temp.wav"
+    # write the final clip next to the temp file and move it into segs/ only when it is complete,
+    # so an interrupted run never leaves a half-written segment that would be skipped on resume
+    stretched_filename = f"output/audio/tmp/{number}_final.wav"
 
     tts_main(text, temp_filename, number, task_df)
 
@@ -56,12 +74,10 @@ def generate_audio(text, target_duration, save_as, number, task_df):
 
     # Check speed factor and adjust audio speed
     if MIN_SPEED_FACTOR <= speed_factor <= MAX_SPEED_FACTOR:
-        change_audio_speed(temp_filename, save_as, speed_factor)
-        final_duration = check_wav_duration(save_as)
+        final_duration = change_audio_speed(temp_filename, stretched_filename, speed_factor)
         rprint(f"✅ {number} Adjusted audio: {save_as} | Duration: {final_duration:.2f}s | Required: {target_duration:.2f}s | Speed factor: {speed_factor:.2f}")
     elif speed_factor < MIN_SPEED_FACTOR:
-        change_audio_speed(temp_filename, save_as, MIN_SPEED_FACTOR)
-        final_duration = check_wav_duration(save_as)
+        final_duration = change_audio_speed(temp_filename, stretched_filename, MIN_SPEED_FACTOR)
         rprint(f"⚠️ {number} Adjusted audio: {save_as} | Duration: {final_duration:.2f}s | Required: {target_duration:.2f}s | Speed factor: {MIN_SPEED_FACTOR}")
     else:  # speed_factor > MAX_SPEED_FACTOR
         rprint(f"🚨 {number} Speed factor out of range: {speed_factor:.2f}, attempting to simplify subtitle...")
@@ -78,18 +94,15 @@ def generate_audio(text, target_duration, save_as, number, task_df):
         new_speed_factor = new_original_duration / (target_duration-0.03)
 
         if MIN_SPEED_FACTOR <= new_speed_factor <= MAX_SPEED_FACTOR:
-            change_audio_speed(temp_filename, save_as, new_speed_factor)
-            final_duration = check_wav_duration(save_as)
+            final_duration = change_audio_speed(temp_filename, stretched_filename, new_speed_factor)
             rprint(f"✅ {number} Adjusted audio: {save_as} | Duration: {final_duration:.2f}s | Required: {target_duration:.2f}s | Speed factor: {new_speed_factor:.2f}")
         elif new_speed_factor > MAX_SPEED_FACTOR:
             rprint(f"🚔 {number} Speed factor still out of range after simplification: {new_speed_factor:.2f}")
-            change_audio_speed(temp_filename, save_as, new_speed_factor) #! force adjust
-            final_duration = check_wav_duration(save_as)
+            final_duration = change_audio_speed(temp_filename, stretched_filename, new_speed_factor) #! force adjust
             rprint(f"🚔 {number} Forced adjustment: {save_as} | Duration: {final_duration:.2f}s | Required: {target_duration:.2f}s | Speed factor: {new_speed_factor}")
         elif new_speed_factor < MIN_SPEED_FACTOR:
             rprint(f"⚠️ {number} Speed factor too low after simplification: {new_speed_factor:.2f}")
-            change_audio_speed(temp_filename, save_as, MIN_SPEED_FACTOR)
-            final_duration = check_wav_duration(save_as)
+            final_duration = change_audio_speed(temp_filename, stretched_filename, MIN_SPEED_FACTOR)
             rprint(f"⚠️ {number} Forced adjustment: {save_as} | Duration: {final_duration:.2f}s | Required: {target_duration:.2f}s | Speed factor: {MIN_SPEED_FACTOR}")
     
     #! check duration for safety
@@ -97,56 +110,103 @@ def generate_audio(text, target_duration, save_as, number, task_df):
         rprint(f"❎ {number} Final duration is longer than target duration: {final_duration:.2f}s | Required: {target_duration:.2f}s. This is a bug, please report it.")
         raise Exception()
     
+    os.replace(stretched_filename, save_as)
     if os.path.exists(temp_filename):
         os.remove(temp_filename)
 
+def time_stretch(samples, sample_rate, speed_factor):
+    """WSOLA time-stretch of a (frames, channels) float array: tempo changes by speed_factor, pitch is kept"""
+    output_len = int(len(samples) / speed_factor)
+    if len(samples) == 0 or abs(speed_factor - 1) < 1e-3:
+        return samples[:output_len]
+
+    frame = int(sample_rate * WSOLA_FRAME_SECONDS) // 2 * 2
+    hop = frame // 2
+    tolerance = int(sample_rate * WSOLA_TOLERANCE_SECONDS)
+    # periodic hann, overlapping halves sum to exactly 1
+    window = np.hanning(frame + 1)[:-1].astype(np.float32)[:, None]
+    n_frames = (output_len + hop) // hop + 2
+
+    # frame k is centred on input sample k * hop * speed_factor, padding keeps every search region in bounds
+    front_pad = tolerance + frame
+    last_nominal = front_pad - hop + int(round((n_frames - 1) * hop * speed_factor))
+    back_pad = max(0, last_nominal + tolerance + 2 * frame - front_pad - len(samples))
+    padded = np.pad(samples, ((front_pad, back_pad), (0, 0)))
+    padded_mono = padded.mean(axis=1)
+
+    output = np.zeros((n_frames * hop + frame, samples.shape[1]), dtype=np.float32)
+    prev_pos = None
+    for k in range(n_frames):
+        nominal = front_pad - hop + int(round(k * hop * speed_factor))
+        if prev_pos is None:
+            pos = nominal
+        else:
+            # pick the frame near the nominal position that best continues the previous one
+            natural = padded_mono[prev_pos + hop:prev_pos + hop + frame]
+            region = padded_mono[nominal - tolerance:nominal + tolerance + frame]
+            pos = nominal - tolerance + int(np.argmax(np.correlate(region, natural, mode='valid')))
+        output[k * hop:k * hop + frame] += padded[pos:pos + frame] * window
+        prev_pos = pos
+
+    return output[hop:hop + output_len]
+
 def change_audio_speed(input_file, output_file, speed_factor):
-    atempo = speed_factor
-    cmd = ['ffmpeg', '-i', input_file, '-filter:a', f'atempo={atempo}', '-y', output_file]
-    
-    max_retries = 3
-    for attempt in range(max_retries):
+    """Time-stretch a TTS clip in process and return the exact duration of the written file"""
+    samples, sample_rate = sf.read(input_file, dtype='float32', always_2d=True)
+    stretched = time_stretch(samples, sample_rate, speed_factor)
+    sf.write(output_file, stretched, sample_rate)
+    return len(stretched) / sample_rate
+
+def get_tts_concurrency():
+    tts_method = load_key("tts_method")
+    limits = load_key("tts_concurrency", default={})
+    return max(1, int(limits.get(tts_method, TTS_CONCURRENCY.get(tts_method, 1))))
+
+def generate_audio_with_retry(row, tasks_df):
+    """Run one TTS task, retrying with exponential backoff (network errors, rate limits, file I/O)"""
+    for attempt in range(TTS_MAX_RETRIES):
         try:
-            subprocess.run(cmd, check=True, stderr=subprocess.PIPE)
-            return  # Success, exit the function
-        except subprocess.CalledProcessError as e:
-            if attempt < max_retries - 1:  # If it's not the last attempt
-                rprint(f"[yellow]Warning: Failed to change audio speed, retrying in 1 second (Attempt {attempt + 1}/{max_retries})[/yellow]")
-                time.sleep(1)
-            else:
-                rprint(f"[red]Error: Failed to change audio speed, maximum retry attempts reached ({max_retries})[/red]")
-                raise e  # Re-raise the exception if all retries failed
+            return generate_audio(row['text'], float(row['duration']), f'output/audio/segs/{row["number"]}.wav', row['number'], tasks_df)
+        except Exception as e:
+            if attempt == TTS_MAX_RETRIES - 1:
+                raise
+            delay = 2 ** attempt + random.uniform(0, 1)
+            rprint(f"[yellow]⚠️ Task {row['number']} failed: {str(e)}, retrying in {delay:.1f}s (Attempt {attempt + 1}/{TTS_MAX_RETRIES})[/yellow]")
+            time.sleep(delay)
 
 def process_sovits_tasks():
-    tasks_df = pd.read_excel("output/audio/sovits_tasks.xlsx")
+    tasks_df = load_artifact('sovits_tasks')
     error_tasks = []
     os.makedirs('output/audio/segs', exist_ok=True)
 
-    with console.status("[bold green]Processing tasks...") as status:
-        for _, row in tqdm(tasks_df.iterrows(), total=len(tasks_df)):
-            output_file = f'output/audio/segs/{row["number"]}.wav'
-            if os.path.exists(output_file):
-                rprint(f"[yellow]File {output_file} already exists, skipping processing[/yellow]")
-                continue
-            try:
-                generate_audio(row['text'], float(row['duration']), output_file, row['number'], tasks_df)
-            except Exception as e:
-                error_tasks.append(row['number'])
-                rprint(Panel(f"Error processing task {row['number']}: {str(e)}", title="Error", border_style="red"))
-
-    if error_tasks:
-        # Retry once, sometimes there might be network issues or file I/O errors
-        rprint(Panel(f"The following tasks encountered errors, retrying: {', '.join(map(str, error_tasks))}", title="Retry", border_style="yellow"))
-        retry_tasks = error_tasks.copy()
-        error_tasks.clear()
-        for task_number in retry_tasks:
-            row = tasks_df[tasks_df['number'] == task_number].iloc[0]
-            output_file = f'output/audio/segs/{row["number"]}.wav'
-            try:
-                generate_audio(row['text'], float(row['duration']), output_file, row['number'], tasks_df)
-            except Exception as e:
-                error_tasks.append(row['number'])
-                rprint(Panel(f"Error retrying task {row['number']}: {str(e)}", title="Error", border_style="red"))
+    # resume: segments already in segs/ are complete (they are moved there atomically)
+    pending_rows = []
+    for _, row in tasks_df.iterrows():
+        output_file = f'output/audio/segs/{row["number"]}.wav'
+        if os.path.exists(output_file):
+            rprint(f"[yellow]File {output_file} already exists, skipping processing[/yellow]")
+            continue
+        pending_rows.append(row)
+
+    concurrency = get_tts_concurrency()
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task(f"[cyan]Generating audio with {concurrency} worker(s)...", total=len(pending_rows))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [(row, executor.submit(generate_audio_with_retry, row, tasks_df)) for row in pending_rows]
+            # collect in subtitle order so progress and errors are reported line by line
+            for row, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    error_tasks.append(row['number'])
+                    rprint(Panel(f"Error processing task {row['number']}: {str(e)}", title="Error", border_style="red"))
+                progress.update(task, advance=1, description=f"[cyan]Generated audio up to line {row['number']}")
 
     if error_tasks:
         error_msg = f"The following tasks failed to process: {', '.join(map(str, error_tasks))}"
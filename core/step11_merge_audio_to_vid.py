@@ -1,14 +1,14 @@
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.config_utils import load_key
+from core.artifact_store import load_artifact
+from core.step1_ytdlp import find_video_files
+from core.step7_merge_sub_to_vid import get_video_encoder, get_subtitle_filter, write_placeholder_video, run_ffmpeg, merge_subtitles_to_video
 from datetime import datetime
-import pandas as pd
 import subprocess
-from pydub import AudioSegment
 from rich import print as rprint
 import numpy as np
 import soundfile as sf
-import cv2
 
 def time_to_datetime(time_str):
     return datetime.strptime(time_str, '%H:%M:%S.%f')
@@ -19,23 +19,33 @@ def create_silence(duration, output_file):
     silence = np.zeros(num_samples, dtype=np.float32)
     sf.write(output_file, silence, sample_rate)
 
+def read_segment(input_audio, sample_rate, channels, frames):
+    """Read a dubbed clip as int16 (frames, channels), converting rate and channels to the merged track"""
+    data, sr = sf.read(input_audio, dtype='int16', always_2d=True)
+    if data.shape[1] != channels:
+        data = np.repeat(data[:, :1], channels, axis=1) if data.shape[1] == 1 else data.mean(axis=1, keepdims=True).astype(np.int16)
+    if sr != sample_rate:
+        src_pos = np.linspace(0, len(data) - 1, num=frames) if len(data) else np.zeros(frames)
+        data = np.stack([np.interp(src_pos, np.arange(len(data)), data[:, c]) for c in range(channels)], axis=1).astype(np.int16)
+    return data[:frames]
+
 def merge_all_audio():
     # Define input and output paths
-    input_excel = 'output/audio/sovits_tasks.xlsx'
     output_audio = 'output/trans_vocal_total.wav'
+    buffer_file = 'output/audio/tmp/merge_buffer.raw'
         
-    df = pd.read_excel(input_excel)
+    df = load_artifact('sovits_tasks')
     
     # Get the sample rate of the first audio file
-    first_audio = f'output/audio/segs/{df.iloc[0]["number"]}.wav'
-    sample_rate = AudioSegment.from_wav(first_audio).frame_rate
-
-    # Create an empty AudioSegment object
-    merged_audio = AudioSegment.silent(duration=0, frame_rate=sample_rate)
+    first_info = sf.info(f'output/audio/segs/{df.iloc[0]["number"]}.wav')
+    sample_rate = first_info.samplerate
 
-    prev_target_start_time = None
-    prev_actual_duration = 0
-    current_merged_duration = 0
+    # Plan where every clip lands before touching any sample data
+    # each op is (input_audio or None for silence, offset in samples, frames)
+    ops = []
+    channels = first_info.channels
+    current_merged_frames = 0
+    max_frames = 0
     
     for index, row in df.iterrows():
         number = row['number']
@@ -46,41 +56,57 @@ def merge_all_audio():
             rprint(f"[bold yellow]Warning: File {input_audio} does not exist, skipping this file.[/bold yellow]")
             continue
         
-        audio_segment = AudioSegment.from_wav(input_audio)
-        actual_duration = len(audio_segment) / 1000  # Convert to seconds
-        target_start_time = time_to_datetime(start_time)
+        info = sf.info(input_audio)
+        channels = max(channels, info.channels)
+        actual_frames = int(round(info.frames * sample_rate / info.samplerate))
         
         # 计算预期的开始时间
-        expected_start_time = (target_start_time - datetime(1900, 1, 1)).total_seconds()
+        expected_start_time = (time_to_datetime(start_time) - datetime(1900, 1, 1)).total_seconds()
+        expected_start_frame = int(round(expected_start_time * sample_rate))
         
         # 检查当前合并音频的持续时间是否与预期开始时间一致
-        time_difference = abs(current_merged_duration - expected_start_time)
+        time_difference = abs(current_merged_frames / sample_rate - expected_start_time)
         
         if time_difference > 3:  # 如果时间相差超过2秒
             rprint(f"[bold yellow]Warning: 音频片段 {number} 的开始时间与当前合并音频时间相差 {time_difference:.2f} 秒，进行时间对齐[/bold yellow]")
             
-            if current_merged_duration < expected_start_time:
+            if current_merged_frames < expected_start_frame:
                 # 如果当前合并音频时间短于预期，添加静音
-                silence_duration = expected_start_time - current_merged_duration
-                silence = AudioSegment.silent(duration=int(silence_duration * 1000), frame_rate=sample_rate)
-                merged_audio += silence
-                current_merged_duration += silence_duration
-            else:
-                # 如果当前合并音频时间长于预期，截断音频
-                merged_audio = merged_audio[:int(expected_start_time * 1000)]
-                current_merged_duration = expected_start_time
+                ops.append((None, current_merged_frames, expected_start_frame - current_merged_frames))
+            # 如果当前合并音频时间长于预期，截断音频（后续片段从预期位置覆盖写入）
+            current_merged_frames = expected_start_frame
         
         # 添加当前音频片段
-        merged_audio += audio_segment
-        current_merged_duration += actual_duration
-        
-        prev_target_start_time = target_start_time
-        prev_actual_duration = actual_duration
+        ops.append((input_audio, current_merged_frames, actual_frames))
+        current_merged_frames += actual_frames
+        max_frames = max(max_frames, current_merged_frames)
+
+    # One preallocated, disk-backed int16 buffer; every clip is written at its sample offset
+    os.makedirs(os.path.dirname(buffer_file), exist_ok=True)
+    merged_audio = np.memmap(buffer_file, dtype=np.int16, mode='w+', shape=(max(max_frames, 1), channels))
+    for input_audio, offset, frames in ops:
+        if input_audio is None:
+            merged_audio[offset:offset + frames] = 0
+        else:
+            segment = read_segment(input_audio, sample_rate, channels, frames)
+            merged_audio[offset:offset + len(segment)] = segment
 
-    # Export the merged audio
-    merged_audio.export(output_audio, format="wav")
+    # Stream the merged track to disk block by block
+    block_frames = sample_rate * 60
+    with sf.SoundFile(output_audio, 'w', samplerate=sample_rate, channels=channels, subtype='PCM_16') as out:
+        for block_start in range(0, current_merged_frames, block_frames):
+            out.write(merged_audio[block_start:min(block_start + block_frames, current_merged_frames)])
+    del merged_audio
+    os.remove(buffer_file)
     rprint(f"[bold green]Audio file successfully merged, output file: {output_audio}[/bold green]")
 
+def get_audio_mix_filter(background_input, vocal_input, dub_input):
+    """Background at full volume, original vocal at original_volume and the dub at dub_volume, mixed to [a]"""
+    original_volume = load_key("original_volume")
+    dub_volume = load_key("dub_volume")
+    return (f'[{background_input}:a]volume=1[a1];[{vocal_input}:a]volume={original_volume}[a2];[{dub_input}:a]volume={dub_volume}[a3];'
+            f'[a1][a2][a3]amix=inputs=3:duration=first:dropout_transition=3[a]')
+
 def merge_video_audio():
     """Merge video and audio, and reduce video volume"""
     video_file = "output/output_video_with_subs.mp4"
@@ -96,22 +122,18 @@ def merge_video_audio():
         return
     
     if load_key("resolution") == '0x0':
-        rprint("[bold yellow]Warning: A 0-second black video will be generated as a placeholder as Resolution is set to 0x0.[/bold yellow]")
-
-        # Create a black frame
-        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_file, fourcc, 1, (1920, 1080))
-        out.write(frame)
-        out.release()
-
-        rprint("[bold green]Placeholder video has been generated.[/bold green]")
+        write_placeholder_video(output_file)
         return
 
-    # Merge video and audio
-    original_volume = load_key("original_volume")
-    dub_volume = load_key("dub_volume")
-    cmd = ['ffmpeg', '-y', '-i', video_file, '-i', background_file, '-i', original_vocal, '-i', audio_file, '-filter_complex', f'[1:a]volume=1[a1];[2:a]volume={original_volume}[a2];[3:a]volume={dub_volume}[a3];[a1][a2][a3]amix=inputs=3:duration=first:dropout_transition=3[a]', '-map', '0:v', '-map', '[a]', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k', output_file]
+    if not os.path.exists(video_file):
+        if load_key("subtitle_mode", default='burn') == 'burn':
+            # no subtitled video yet: burn subtitles and mix audio in one encode
+            render_video_with_audio(background_file, original_vocal, audio_file, output_file)
+            return
+        merge_subtitles_to_video()  # soft subtitles are only a stream copy
+
+    # Merge video and audio, the subtitled video stream and any soft subtitle tracks are copied as is
+    cmd = ['ffmpeg', '-y', '-i', video_file, '-i', background_file, '-i', original_vocal, '-i', audio_file, '-filter_complex', get_audio_mix_filter(1, 2, 3), '-map', '0:v', '-map', '[a]', '-map', '0:s?', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k', '-c:s', 'copy', output_file]
 
     try:
         subprocess.run(cmd, check=True)
@@ -123,6 +145,22 @@ def merge_video_audio():
     if os.path.exists('tmp_audio.wav'):
         os.remove('tmp_audio.wav')
 
+def render_video_with_audio(background_file, original_vocal, audio_file, output_file):
+    """One ffmpeg pass from the source video: scale/pad and both subtitle tracks on the video, the dub mix on the audio"""
+    src_srt = "output/src_subtitles.srt"
+    trans_srt = "output/trans_subtitles.srt"
+    if not os.path.exists(src_srt) or not os.path.exists(trans_srt):
+        raise FileNotFoundError("Subtitle files not found in the 'output' directory, run the subtitle steps first.")
+
+    _, global_args, filter_suffix, encoder_args = get_video_encoder()
+    filter_graph = f'[0:v]{get_subtitle_filter(src_srt, trans_srt)}{filter_suffix}[v];{get_audio_mix_filter(1, 2, 3)}'
+    cmd = ['ffmpeg', '-y', *global_args, '-i', find_video_files(), '-i', background_file, '-i', original_vocal, '-i', audio_file,
+           '-filter_complex', filter_graph.encode('utf-8'), '-map', '[v]', '-map', '[a]', *encoder_args, '-c:a', 'aac', '-b:a', '192k', output_file]
+
+    print("🎬 Start rendering subtitles and dubbed audio in a single pass...")
+    if not run_ffmpeg(cmd, f"🎉🎥 Video with subtitles and dubbed audio rendered into {output_file}"):
+        raise RuntimeError("Single-pass render failed, see the FFmpeg output above.")
+
 def merge_main():
     merge_all_audio()
     merge_video_audio()
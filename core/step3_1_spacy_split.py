@@ -1,12 +1,13 @@
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from spacy_utils.split_by_comma import split_by_comma_main
-from spacy_utils.split_by_connector import split_sentences_main
-from spacy_utils.split_by_mark import split_by_mark
-from spacy_utils.split_long_by_root import split_long_by_root_main
-from spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.split_by_comma import split_by_comma_main
+from core.spacy_utils.split_by_connector import split_sentences_main
+from core.spacy_utils.split_by_mark import split_by_mark
+from core.spacy_utils.split_long_by_root import split_long_by_root_main
+from core.spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.doc_store import save_doc_store
 
 def split_by_spacy():
     if os.path.exists('output/log/sentence_splitbynlp.txt'):
@@ -18,6 +19,7 @@ def split_by_spacy():
     split_by_comma_main(nlp)
     split_sentences_main(nlp)
     split_long_by_root_main(nlp)
+    save_doc_store(nlp)
     return
 
 if __name__ == '__main__':
@@ -1,23 +1,35 @@
 import sys,os,math
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import concurrent.futures
-from core.ask_gpt import ask_gpt
+from core.ask_gpt import ask_gpt, ask_gpt_batch
 from core.prompts_storage import get_split_prompt
 from difflib import SequenceMatcher
 import math
 from core.spacy_utils.load_nlp_model import init_nlp
+from core.spacy_utils.doc_store import get_doc, parse_texts, save_doc_store
 from core.config_utils import load_key, get_joiner
 from rich.console import Console
 from rich.table import Table
 import re
+import itertools
 
 console = Console()
+# characters on each side of the aligned estimate that are scored when the LLM changed the text
+SPLIT_SEARCH_WINDOW = 20
 
 def tokenize_sentence(sentence, nlp):
     # tokenizer counts the number of words in the sentence
-    doc = nlp(sentence)
+    doc = get_doc(sentence, nlp)
     return [token.text for token in doc]
 
+def map_to_original(opcodes, pos):
+    """Map an offset in the modified text to the original text through SequenceMatcher opcodes"""
+    for tag, i1, i2, j1, j2 in opcodes:
+        if pos <= j2:
+            if tag == 'equal' or j2 == j1:
+                return i1 + min(pos - j1, i2 - i1)
+            return i1 + round((pos - j1) * (i2 - i1) / (j2 - j1))
+    return opcodes[-1][2] if opcodes else 0
+
 def find_split_positions(original, modified):
     split_positions = []
     parts = modified.split('[br]')
@@ -25,16 +37,29 @@ def find_split_positions(original, modified):
     whisper_language = load_key("whisper.language")
     language = load_key("whisper.detected_language") if whisper_language == 'auto' else whisper_language
     joiner = get_joiner(language)
-
+    modified_parts = [joiner.join(part.split()) for part in parts]
+
+    # Fast path: the LLM only inserted [br] (whitespace aside), so every part ends right after
+    # its last non-space character in the original, which is where the best match always is
+    if ''.join(original.split()) == ''.join(''.join(modified_parts).split()):
+        # char_ends[k] is the index right after the k-th non-space character of the original
+        char_ends = [0] + [pos + 1 for pos, char in enumerate(original) if not char.isspace()]
+        part_chars = [len(''.join(part.split())) for part in modified_parts[:-1]]
+        return [char_ends[count] for count in itertools.accumulate(part_chars)]
+
+    # Otherwise align the whole texts once and only score split points near the aligned estimate
+    opcodes = SequenceMatcher(None, original, joiner.join(modified_parts), autojunk=False).get_opcodes()
+    part_end = 0
     for i in range(len(parts) - 1):
+        part_end += len(modified_parts[i]) + (len(joiner) if i > 0 else 0)
+        center = max(start, map_to_original(opcodes, part_end))
         max_similarity = 0
         best_split = None
 
-        for j in range(start, len(original)):
-            original_left = original[start:j]
-            modified_left = joiner.join(parts[i].split())
-
-            left_similarity = SequenceMatcher(None, original_left, modified_left).ratio()
+        matcher = SequenceMatcher(None, b=modified_parts[i])
+        for j in range(max(start, center - SPLIT_SEARCH_WINDOW), min(len(original), center + SPLIT_SEARCH_WINDOW + 1)):
+            matcher.set_seq1(original[start:j])
+            left_similarity = matcher.ratio()
 
             if left_similarity > max_similarity:
                 max_similarity = left_similarity
@@ -72,33 +97,35 @@ def extract_best_number(best_value):
     console.print(f"[yellow]Warning: Could not determine best split. Defaulting to 1.[/yellow]")
     return 1
 
-def split_sentence(sentence, num_parts, word_limit=18, index=-1, retry_attempt=0):
-    """Split a long sentence using GPT and return the result as a string."""
-    split_prompt = get_split_prompt(sentence, num_parts, word_limit)
-    def valid_split(response_data):
-        # 严格校验返回的 JSON 数据
-        required_keys = ["analysis", "split_1", "split_2", "eval", "best"]
-        
-        # 检查所有必需的键是否存在
-        for key in required_keys:
-            if key not in response_data:
-                return {
-                    "status": "error", 
-                    "message": f"缺少必需的键: `{key}`"
-                }
-        
-        # 检查每个键的值是否为非空字符串（除了 best）
-        for key in ["analysis", "split_1", "split_2", "eval"]:
-            if not isinstance(response_data[key], str) or not response_data[key].strip():
-                return {
-                    "status": "error", 
-                    "message": f"键 `{key}` 必须是非空字符串"
-                }
-        
-        return {"status": "success", "message": "Split completed"}
+def valid_split(response_data):
+    # 严格校验返回的 JSON 数据
+    required_keys = ["analysis", "split_1", "split_2", "eval", "best"]
+    
+    # 检查所有必需的键是否存在
+    for key in required_keys:
+        if key not in response_data:
+            return {
+                "status": "error", 
+                "message": f"缺少必需的键: `{key}`"
+            }
     
-    response_data = ask_gpt(split_prompt + ' ' * retry_attempt, response_json=True, valid_def=valid_split, log_title='sentence_splitbymeaning')
+    # 检查每个键的值是否为非空字符串（除了 best）
+    for key in ["analysis", "split_1", "split_2", "eval"]:
+        if not isinstance(response_data[key], str) or not response_data[key].strip():
+            return {
+                "status": "error", 
+                "message": f"键 `{key}` 必须是非空字符串"
+            }
     
+    return {"status": "success", "message": "Split completed"}
+
+def get_split_request(sentence, num_parts, word_limit=18, retry_attempt=0):
+    """ask_gpt arguments for splitting one sentence"""
+    split_prompt = get_split_prompt(sentence, num_parts, word_limit)
+    return dict(prompt=split_prompt + ' ' * retry_attempt, response_json=True, valid_def=valid_split, log_title='sentence_splitbymeaning')
+
+def apply_split(sentence, response_data, index=-1):
+    """Cut the original sentence where the LLM's best split puts its breaks"""
     # 使用新的提取方法获取 best 值
     best = extract_best_number(response_data['best'])
     best_split = response_data[f"split_{best}"]
@@ -124,30 +151,31 @@ def split_sentence(sentence, num_parts, word_limit=18, index=-1, retry_attempt=0
     
     return best_split
 
-def parallel_split_sentences(sentences, max_length, max_workers, nlp, retry_attempt=0):
-    """Split sentences in parallel using a thread pool."""
-    new_sentences = [None] * len(sentences)
-    futures = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for index, sentence in enumerate(sentences):
-            # Use tokenizer to split the sentence
-            tokens = tokenize_sentence(sentence, nlp)
-            # print("Tokenization result:", tokens)
-            num_parts = math.ceil(len(tokens) / max_length)
-            if len(tokens) > max_length:
-                future = executor.submit(split_sentence, sentence, num_parts, max_length, index=index, retry_attempt=retry_attempt)
-                futures.append((future, index, num_parts, sentence))
-            else:
-                new_sentences[index] = [sentence]
-
-        for future, index, num_parts, sentence in futures:
-            split_result = future.result()
-            if split_result:
-                split_lines = split_result.strip().split('\n')
-                new_sentences[index] = [line.strip() for line in split_lines]
-            else:
-                new_sentences[index] = [sentence]
+def split_sentence(sentence, num_parts, word_limit=18, index=-1, retry_attempt=0):
+    """Split a long sentence using GPT and return the result as a string."""
+    response_data = ask_gpt(**get_split_request(sentence, num_parts, word_limit, retry_attempt))
+    return apply_split(sentence, response_data, index)
+
+def parallel_split_sentences(sentences, max_length, nlp, retry_attempt=0):
+    """Split all long sentences with one batch of concurrent LLM requests."""
+    new_sentences = [[sentence] for sentence in sentences]
+    parse_texts(sentences, nlp)
+
+    long_sentences = []
+    for index, sentence in enumerate(sentences):
+        # Use tokenizer to split the sentence
+        tokens = tokenize_sentence(sentence, nlp)
+        if len(tokens) > max_length:
+            long_sentences.append((index, sentence, math.ceil(len(tokens) / max_length)))
+
+    responses = ask_gpt_batch([get_split_request(sentence, num_parts, max_length, retry_attempt) for _, sentence, num_parts in long_sentences])
+    for (index, sentence, _), response_data in zip(long_sentences, responses):
+        if isinstance(response_data, Exception):
+            raise response_data
+        split_result = apply_split(sentence, response_data, index)
+        if split_result:
+            split_lines = split_result.strip().split('\n')
+            new_sentences[index] = [line.strip() for line in split_lines]
 
     return [sentence for sublist in new_sentences for sentence in sublist]
 
@@ -160,7 +188,9 @@ def split_sentences_by_meaning():
     nlp = init_nlp()
     # 🔄 process sentences multiple times to ensure all are split
     for retry_attempt in range(3):
-        sentences = parallel_split_sentences(sentences, max_length=load_key("max_split_length"), max_workers=load_key("max_workers"), nlp=nlp, retry_attempt=retry_attempt)
+        sentences = parallel_split_sentences(sentences, max_length=load_key("max_split_length"), nlp=nlp, retry_attempt=retry_attempt)
+
+    save_doc_store(nlp)
 
     # 💾 save results
     with open('output/log/sentence_splitbymeaning.txt', 'w', encoding='utf-8') as f:
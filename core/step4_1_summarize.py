@@ -1,12 +1,12 @@
 import os, sys, json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.ask_gpt import ask_gpt
-import pandas as pd
 from core.prompts_storage import get_summary_prompt
+from core.artifact_store import load_artifact
 
 def combine_chunks():
     """Combine the text chunks identified by whisper into a single long text"""
-    df = pd.read_excel('output/log/cleaned_chunks.xlsx')
+    df = load_artifact('cleaned_chunks')
     df['text'] = df['text'].str.strip('"').str.strip()
     combined_text = ' '.join(df['text'])
     return combined_text[:4000]  #! Return only the first 4000 characters
@@ -2,73 +2,171 @@ import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import pandas as pd
 import json
+import hashlib
+from threading import Lock
 import concurrent.futures
 from core.translate_once import translate_lines
+from core.ask_gpt import estimate_tokens
+from core.prompts_storage import generate_shared_prompt, get_prompt_faithfulness, get_prompt_expressiveness, get_prompt_one_shot
 from core.step4_1_summarize import search_things_to_note_in_prompt
-from core.step8_gen_audio_task import check_len_then_trim
+from core.step8_gen_audio_task import trim_subtitles_batch
 from core.step6_generate_final_timeline import align_timestamp
 from core.config_utils import load_key
+from core.artifact_store import load_artifact, save_artifact, artifact_exists, artifact_path
 from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
 console = Console()
 
-# Function to split text into chunks
-def split_chunks_by_chars(chunk_size=600, max_i=12): 
-    """Split text into chunks based on character count, return a list of multi-line text chunks"""
-    with open("output/log/sentence_splitbymeaning.txt", "r", encoding="utf-8") as file:
-        sentences = file.read().strip().split('\n')
+# (context window, max output tokens) by model name, first substring match wins.
+# Override per api with `context_window` / `max_output_tokens` in config.yaml
+MODEL_TOKEN_LIMITS = [
+    ('claude-3-5-sonnet', 200000, 8192),
+    ('claude', 200000, 4096),
+    ('gpt-4o-mini', 128000, 16384),
+    ('gpt-4o', 128000, 4096),
+    ('deepseek', 64000, 4096),
+    ('gemini', 1000000, 8192),
+    ('qwen', 32000, 2048),
+]
+DEFAULT_TOKEN_LIMITS = (8192, 2048)  # unknown models get a small, safe budget
+# the expressiveness answer repeats origin and direct and adds reflection and free per line
+COMPLETION_PER_SOURCE_TOKEN = 4.5
+COMPLETION_PER_LINE = 40
+CONTEXT_LINES = 5  # 3 previous + 2 subsequent lines in the shared prompt
+CHECKPOINT_FILE = 'output/log/translation_checkpoints.jsonl'
+checkpoint_lock = Lock()
+
+def get_token_budget():
+    """(prompt + completion budget, completion budget) that fits every configured api"""
+    ratio = load_key("translate_chunk.budget_ratio", default=0.8)
+    total_budget, completion_budget = None, None
+    for api_config in load_key("apis").values():
+        model = api_config.get("model", "")
+        context_window, max_output = next(((ctx, out) for name, ctx, out in MODEL_TOKEN_LIMITS if name in model), DEFAULT_TOKEN_LIMITS)
+        context_window = api_config.get("context_window", context_window)
+        max_output = api_config.get("max_output_tokens", max_output)
+        total_budget = min(total_budget or context_window, context_window)
+        completion_budget = min(completion_budget or max_output, max_output)
+    total_budget, completion_budget = total_budget or DEFAULT_TOKEN_LIMITS[0], completion_budget or DEFAULT_TOKEN_LIMITS[1]
+    return int(total_budget * ratio), int(completion_budget * ratio)
+
+def get_prompt_overhead(theme_prompt):
+    """Tokens of the translation prompts without any subtitle lines, and the extra prompt tokens per line"""
+    empty = max(estimate_tokens(get_prompt_faithfulness('', '')), estimate_tokens(get_prompt_expressiveness({}, '', '')), estimate_tokens(get_prompt_one_shot('', '')))
+    one_line = estimate_tokens(get_prompt_expressiveness({'1': {'origin': '', 'direct': ''}}, '', ''))
+    shared = estimate_tokens(generate_shared_prompt('', '', theme_prompt, ''))
+    return empty + shared, one_line - empty
+
+def is_anchor(sentence, interval):
+    """Content-defined chunk boundary: after an edit upstream, chunking falls back into step at the next anchor"""
+    return int(hashlib.md5(sentence.encode('utf-8')).hexdigest(), 16) % interval == 0
 
-    chunks = []
-    chunk = ''
-    sentence_count = 0
-    for sentence in sentences:
-        if len(chunk) + len(sentence + '\n') > chunk_size or sentence_count == max_i:
-            chunks.append(chunk.strip())
-            chunk = sentence + '\n'
-            sentence_count = 1
-        else:
-            chunk += sentence + '\n'
-            sentence_count += 1
-    chunks.append(chunk.strip())
+def plan_chunks(sentences, terms, theme_prompt):
+    """Pack consecutive sentences into chunks that fit the token budget of every configured model"""
+    total_budget, completion_budget = get_token_budget()
+    max_lines = load_key("translate_chunk.max_lines", default=20)
+    fixed_prompt, per_line_prompt = get_prompt_overhead(theme_prompt)
+    sentence_tokens = [estimate_tokens(sentence) for sentence in sentences]
+    avg_tokens = sum(sentence_tokens) / max(len(sentences), 1)
+    fixed_prompt += int(CONTEXT_LINES * avg_tokens)
+    term_prompts = [(term['original'].lower(), estimate_tokens(f'{term["original"]}: {term["translation"]}, meaning: {term["explanation"]}')) for term in terms]
+
+    # about one anchor every two full chunks, so an edited sentence only moves the boundaries between its anchors
+    anchor_interval = 2 * max_lines
+    chunks, chunk = [], []
+    prompt_tokens = completion_tokens = 0
+    chunk_terms = set()
+    for sentence, tokens in zip(sentences, sentence_tokens):
+        # lines show up in the subtitle block, as origin and as direct translation of the expressiveness prompt
+        line_prompt = per_line_prompt + 3 * tokens
+        line_completion = COMPLETION_PER_LINE + int(COMPLETION_PER_SOURCE_TOKEN * tokens)
+        new_terms = {i for i, (original, _) in enumerate(term_prompts) if i not in chunk_terms and original in sentence.lower()}
+        terms_tokens = sum(term_prompts[i][1] for i in new_terms)
+
+        fits = (not (chunk and is_anchor(chunk[-1], anchor_interval))
+                and len(chunk) < max_lines
+                and completion_tokens + line_completion <= completion_budget
+                and fixed_prompt + prompt_tokens + line_prompt + terms_tokens + completion_tokens + line_completion <= total_budget)
+        if chunk and not fits:
+            chunks.append('\n'.join(chunk))
+            chunk, prompt_tokens, completion_tokens, chunk_terms = [], 0, 0, set()
+            new_terms = {i for i, (original, _) in enumerate(term_prompts) if original in sentence.lower()}
+            terms_tokens = sum(term_prompts[i][1] for i in new_terms)
+        chunk.append(sentence)
+        chunk_terms |= new_terms
+        prompt_tokens += line_prompt + terms_tokens
+        completion_tokens += line_completion
+    if chunk:
+        chunks.append('\n'.join(chunk))
+
+    console.print(f"[cyan]📦 Planned {len(chunks)} chunks for {len(sentences)} lines, budget {total_budget} tokens per request, {completion_budget} for the answer[/cyan]")
     return chunks
 
+def split_chunks_by_tokens(theme_prompt=None):
+    """Split text into token-budgeted chunks, return a list of multi-line text chunks"""
+    with open("output/log/sentence_splitbymeaning.txt", "r", encoding="utf-8") as file:
+        sentences = file.read().strip().split('\n')
+    with open('output/log/terminology.json', 'r', encoding='utf-8') as file:
+        terms = json.load(file).get('terms', [])
+    return plan_chunks(sentences, terms, theme_prompt)
+
 # Get context from surrounding chunks
 def get_previous_content(chunks, chunk_index):
     return None if chunk_index == 0 else chunks[chunk_index - 1].split('\n')[-3:] # Get last 3 lines
 def get_after_content(chunks, chunk_index):
     return None if chunk_index == len(chunks) - 1 else chunks[chunk_index + 1].split('\n')[:2] # Get first 2 lines
 
+def chunk_checkpoint_key(chunk, previous_content_prompt, after_content_prompt, things_to_note_prompt, theme_prompt):
+    """A chunk is reused only if everything that goes into its prompts is unchanged"""
+    raw = json.dumps([load_key("target_language"), load_key("translation_mode", default='two_step'), chunk, previous_content_prompt, after_content_prompt, things_to_note_prompt, theme_prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def load_checkpoints():
+    checkpoints = {}
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                    checkpoints[record['key']] = record['translation']
+                except (ValueError, KeyError):
+                    continue  # a line cut off by an interrupted run
+    return checkpoints
+
+def save_checkpoint(key, chunk, translation):
+    with checkpoint_lock:
+        with open(CHECKPOINT_FILE, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({"key": key, "chunk": chunk, "translation": translation}, ensure_ascii=False) + '\n')
+
 # 🔍 Translate a single chunk
-def translate_chunk(chunk, chunks, theme_prompt, i):
+def translate_chunk(chunk, chunks, theme_prompt, i, checkpoints=None):
     things_to_note_prompt = search_things_to_note_in_prompt(chunk)
     previous_content_prompt = get_previous_content(chunks, i)
     after_content_prompt = get_after_content(chunks, i)
+    key = chunk_checkpoint_key(chunk, previous_content_prompt, after_content_prompt, things_to_note_prompt, theme_prompt)
+    if checkpoints is not None and key in checkpoints:
+        console.print(f"[green]♻️ Chunk {i} restored from checkpoint[/green]")
+        return i, chunk, checkpoints[key]
     translation, english_result = translate_lines(chunk, previous_content_prompt, after_content_prompt, things_to_note_prompt, theme_prompt, i)
+    save_checkpoint(key, chunk, translation)
     return i, english_result, translation
 
 # 🚀 Main function to translate all chunks
 def translate_all():
     # Check if the file exists
-    if os.path.exists("output/log/translation_results.xlsx"):
-        console.print(Panel("🚨 File `translation_results.xlsx` already exists, skipping TRANSLATE ALL.", title="Warning", border_style="yellow"))
+    if artifact_exists('translation_results'):
+        console.print(Panel(f"🚨 File `{artifact_path('translation_results')}` already exists, skipping TRANSLATE ALL.", title="Warning", border_style="yellow"))
         return
     
     console.print("[bold green]Start Translating All...[/bold green]")
     
-    # 获取第一个 API 配置的模型
-    apis = load_key("apis")
-    first_api_model = apis.get("api1", {}).get("model", "")
-    
-    if 'sonnet' in first_api_model:
-        chunks = split_chunks_by_chars()
-    else:
-        console.print("[yellow]🚨 Not using sonnet, using smaller chunk size and max_i to avoid OOM[/yellow]")
-        chunks = split_chunks_by_chars(chunk_size=400, max_i=8)
-    
     with open('output/log/terminology.json', 'r', encoding='utf-8') as file:
         theme_prompt = json.load(file).get('theme')
+    chunks = split_chunks_by_tokens(theme_prompt)
+    # finished chunks from earlier runs, only missing or changed ones are sent to the LLM
+    checkpoints = load_checkpoints()
 
     # 🔄 Use concurrent execution for translation
     with Progress(
@@ -78,16 +176,25 @@ def translate_all():
     ) as progress:
         task = progress.add_task("[cyan]Translating chunks...", total=len(chunks))
         with concurrent.futures.ThreadPoolExecutor(max_workers=load_key("max_workers")) as executor:
-            futures = []
+            futures = {}
             for i, chunk in enumerate(chunks):
-                future = executor.submit(translate_chunk, chunk, chunks, theme_prompt, i)
-                futures.append(future)
+                future = executor.submit(translate_chunk, chunk, chunks, theme_prompt, i, checkpoints)
+                futures[future] = i
 
             results = []
+            failed_chunks = []
             for future in concurrent.futures.as_completed(futures):
-                results.append(future.result())
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed_chunks.append(futures[future])
+                    console.print(f"[red]❌ Chunk {futures[future]} failed: {e}[/red]")
                 progress.update(task, advance=1)
 
+    if failed_chunks:
+        raise ValueError(f"❌ {len(failed_chunks)} of {len(chunks)} chunks failed to translate: {sorted(failed_chunks)}. "
+                         f"The other chunks are saved in `{CHECKPOINT_FILE}`, rerun to retry only the failed ones.")
+
     results.sort(key=lambda x: x[0])  # Sort results based on original order
     
     # 💾 Save results to lists and Excel file
@@ -97,17 +204,18 @@ def translate_all():
         trans_text.extend(translation.split('\n'))
     
     # Trim long translation text
-    df_text = pd.read_excel('output/log/cleaned_chunks.xlsx')
+    df_text = load_artifact('cleaned_chunks')
     df_text['text'] = df_text['text'].str.strip('"').str.strip()
     df_translate = pd.DataFrame({'Source': src_text, 'Translation': trans_text})
     subtitle_output_configs = [('trans_subs_for_audio.srt', ['Translation'])]
     df_time = align_timestamp(df_text, df_translate, subtitle_output_configs, output_dir=None, for_display=False)
     console.print(df_time)
-    # apply check_len_then_trim to df_time['Translation'], only when duration > MIN_TRIM_DURATION.
-    df_time['Translation'] = df_time.apply(lambda x: check_len_then_trim(x['Translation'], x['duration']) if x['duration'] > load_key("min_trim_duration") else x['Translation'], axis=1)
+    # trim over-long translations in grouped requests, only when duration > MIN_TRIM_DURATION.
+    trim_mask = df_time['duration'] > load_key("min_trim_duration")
+    df_time.loc[trim_mask, 'Translation'] = trim_subtitles_batch(df_time.loc[trim_mask, 'Translation'], df_time.loc[trim_mask, 'duration'])
     console.print(df_time)
     
-    df_time.to_excel("output/log/translation_results.xlsx", index=False)
+    save_artifact(df_time, 'translation_results')
     console.print("[bold green]✅ Translation completed and results saved.[/bold green]")
 
 if __name__ == '__main__':
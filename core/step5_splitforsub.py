@@ -1,5 +1,6 @@
 import sys, os
 import pandas as pd
+import numpy as np
 from typing import List, Tuple
 import concurrent.futures
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -8,33 +9,15 @@ from core.step3_2_splitbymeaning import split_sentence
 from core.ask_gpt import ask_gpt
 from core.prompts_storage import get_align_prompt
 from core.config_utils import load_key
-from rich.panel import Panel
+from core.text_metrics import calc_lens  # ! You can modify your own weights in text_metrics.CHAR_WEIGHT_RANGES
+from core.artifact_store import load_artifact, save_artifact, artifact_exists, artifact_path
 from rich.console import Console
 from rich.table import Table
 
 console = Console()
 
-# ! You can modify your own weights here
-# Chinese and Japanese 2.5 characters, Korean 2 characters, Thai 1.5 characters, full-width symbols 2 characters, other English-based and half-width symbols 1 character
-def calc_len(text: str) -> float:
-    text = str(text) # force convert
-    def char_weight(char):
-        code = ord(char)
-        if 0x4E00 <= code <= 0x9FFF or 0x3040 <= code <= 0x30FF:  # Chinese and Japanese
-            return 1.75
-        elif 0xAC00 <= code <= 0xD7A3 or 0x1100 <= code <= 0x11FF:  # Korean
-            return 1.5
-        elif 0x0E00 <= code <= 0x0E7F:  # Thai
-            return 1
-        elif 0xFF01 <= code <= 0xFF5E:  # full-width symbols
-            return 1.75
-        else:  # other characters (e.g. English and half-width symbols)
-            return 1
-
-    return sum(char_weight(char) for char in text)
-
-def align_subs(src_sub: str, tr_sub: str, src_part: str) -> Tuple[List[str], List[str]]:
-    align_prompt = get_align_prompt(src_sub, tr_sub, src_part)
+def align_subs(src_sub: str, tr_sub: str, src_part: str, retry_attempt=0) -> Tuple[List[str], List[str]]:
+    align_prompt = get_align_prompt(src_sub, tr_sub, src_part) + ' ' * retry_attempt
     
     def valid_align(response_data):
         # 严格校验返回的 JSON 数据
@@ -125,52 +108,117 @@ def align_subs(src_sub: str, tr_sub: str, src_part: str) -> Tuple[List[str], Lis
     
     return src_parts, tr_parts
 
+def get_too_long(src_lines, tr_lines, max_length, target_multiplier):
+    """Boolean mask of the lines whose source or weighted target length exceeds the subtitle limit"""
+    src_lens = np.array([len(str(src)) for src in src_lines])
+    return (src_lens > max_length) | (calc_lens(tr_lines) * target_multiplier > max_length)
+
+def flatten_line(node):
+    """Source and target pieces of a line, in order, after all its splits"""
+    if node['parts'] is None:
+        return [node['src']], [node['tr']]
+    src_pieces, tr_pieces = [], []
+    for part in node['parts']:
+        part_src, part_tr = flatten_line(part)
+        src_pieces.extend(part_src)
+        tr_pieces.extend(part_tr)
+    return src_pieces, tr_pieces
+
 def split_align_subs(src_lines: List[str], tr_lines: List[str], max_retry=5) -> Tuple[List[str], List[str]]:
+    """
+    Split every line that is too long for a subtitle. Each line goes through split_sentence and then align_subs
+    as soon as its own split is done, and only the parts that are still too long are queued again, each line
+    at most max_retry times. Failed lines are reported together at the end.
+    """
     subtitle_set = load_key("subtitle")
     MAX_SUB_LENGTH = subtitle_set["max_length"]
     TARGET_SUB_MULTIPLIER = subtitle_set["target_multiplier"]
-    for attempt in range(max_retry):
-        console.print(Panel(f"🔄 Split attempt {attempt + 1}", expand=False))
-        to_split = []
-        
-        for i, (src, tr) in enumerate(zip(src_lines, tr_lines)):
-            src, tr = str(src), str(tr)
-            if len(src) > MAX_SUB_LENGTH or calc_len(tr) * TARGET_SUB_MULTIPLIER > MAX_SUB_LENGTH:
-                to_split.append(i)
-                table = Table(title=f"📏 Line {i} needs to be split")
-                table.add_column("Type", style="cyan")
-                table.add_column("Content", style="magenta")
-                table.add_row("Source Line", src)
-                table.add_row("Target Line", tr)
-                console.print(table)
-        
-        def process(i):
-            split_src = split_sentence(src_lines[i], num_parts=2).strip()
-            src_lines[i], tr_lines[i] = align_subs(src_lines[i], tr_lines[i], split_src)
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=load_key("max_workers")) as executor:
-            executor.map(process, to_split)
+    nodes = [{'src': src, 'tr': tr, 'parts': None} for src, tr in zip(src_lines, tr_lines)]
+    to_split = np.nonzero(get_too_long(src_lines, tr_lines, MAX_SUB_LENGTH, TARGET_SUB_MULTIPLIER))[0].tolist()
+    
+    for i in to_split:
+        src, tr = str(src_lines[i]), str(tr_lines[i])
+        table = Table(title=f"📏 Line {i} needs to be split")
+        table.add_column("Type", style="cyan")
+        table.add_column("Content", style="magenta")
+        table.add_row("Source Line", src)
+        table.add_row("Target Line", tr)
+        console.print(table)
+    
+    failures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=load_key("max_workers")) as executor:
+        # future -> (stage, line index, node, attempt)
+        pending = {}
+        def submit_split(i, node, attempt):
+            # retry_attempt changes the prompt, so a retry is not answered from the gpt log cache
+            pending[executor.submit(split_sentence, str(node['src']), num_parts=2, retry_attempt=attempt - 1)] = ('split', i, node, attempt)
         
-        # Flatten `src_lines` and `tr_lines`
-        src_lines = [item for sublist in src_lines for item in (sublist if isinstance(sublist, list) else [sublist])]
-        tr_lines = [item for sublist in tr_lines for item in (sublist if isinstance(sublist, list) else [sublist])]
+        for i in to_split:
+            submit_split(i, nodes[i], 1)
         
-        if all(len(src) <= MAX_SUB_LENGTH for src in src_lines) and all(calc_len(tr) * TARGET_SUB_MULTIPLIER <= MAX_SUB_LENGTH for tr in tr_lines):
-            break
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage, i, node, attempt = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failures.append((i, stage, node['src'], e))
+                    continue
+                
+                if stage == 'split':
+                    pending[executor.submit(align_subs, str(node['src']), str(node['tr']), result.strip(), attempt - 1)] = ('align', i, node, attempt)
+                    continue
+                
+                src_parts, tr_parts = result
+                if len(src_parts) != len(tr_parts):
+                    # unequal parts would shift every later subtitle against its translation
+                    if attempt < max_retry:
+                        console.print(f"[yellow]⚠️ Line {i}: {len(src_parts)} source parts but {len(tr_parts)} target parts, retrying the split (retry level {attempt})[/yellow]")
+                        submit_split(i, node, attempt + 1)
+                    else:
+                        console.print(f"[yellow]⚠️ Line {i}: {len(src_parts)} source parts but {len(tr_parts)} target parts after {max_retry} attempts, keeping it unsplit[/yellow]")
+                    continue
+                node['parts'] = [{'src': src, 'tr': tr, 'parts': None} for src, tr in zip(src_parts, tr_parts)]
+                still_too_long = get_too_long(src_parts, tr_parts, MAX_SUB_LENGTH, TARGET_SUB_MULTIPLIER)
+                for part, too_long in zip(node['parts'], still_too_long):
+                    if not too_long:
+                        continue
+                    if attempt < max_retry:
+                        console.print(f"[yellow]🔄 Line {i} still has a part that is too long, split attempt {attempt + 1}[/yellow]")
+                        submit_split(i, part, attempt + 1)
+                    else:
+                        console.print(f"[yellow]⚠️ Line {i} is still too long after {max_retry} split attempts: {part['src']}[/yellow]")
+    
+    if failures:
+        table = Table(title="❌ Lines that failed to split")
+        table.add_column("Line", style="cyan")
+        table.add_column("Stage", style="magenta")
+        table.add_column("Source")
+        table.add_column("Error", style="red")
+        for i, stage, src, e in sorted(failures, key=lambda failure: failure[0]):
+            table.add_row(str(i), stage, str(src), str(e))
+        console.print(table)
+        raise ValueError(f"❌ {len(failures)} subtitle splits failed on lines {sorted({failure[0] for failure in failures})}, see the table above")
     
+    src_lines, tr_lines = [], []
+    for node in nodes:
+        src_pieces, tr_pieces = flatten_line(node)
+        src_lines.extend(src_pieces)
+        tr_lines.extend(tr_pieces)
     return src_lines, tr_lines
 
 def split_for_sub_main():
-    if os.path.exists("output/log/translation_results_for_subtitles.xlsx"):
-        console.print("[yellow]🚨 File `translation_results_for_subtitles.xlsx` already exists, skipping this step.[/yellow]")
+    if artifact_exists('translation_results_for_subtitles'):
+        console.print(f"[yellow]🚨 File `{artifact_path('translation_results_for_subtitles')}` already exists, skipping this step.[/yellow]")
         return
 
     console.print("[bold green]🚀 Start splitting subtitles...[/bold green]")
-    df = pd.read_excel("output/log/translation_results.xlsx")
+    df = load_artifact('translation_results')
     src_lines = df['Source'].tolist()
     tr_lines = df['Translation'].tolist()
     src_lines, tr_lines = split_align_subs(src_lines, tr_lines, max_retry=5)
-    pd.DataFrame({'Source': src_lines, 'Translation': tr_lines}).to_excel("output/log/translation_results_for_subtitles.xlsx", index=False)
+    save_artifact(pd.DataFrame({'Source': src_lines, 'Translation': tr_lines}), 'translation_results_for_subtitles')
     console.print("[bold green]✅ Subtitles splitting completed![/bold green]")
 
 if __name__ == '__main__':
@@ -2,8 +2,11 @@ import pandas as pd
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from difflib import SequenceMatcher
+from bisect import bisect_left
+from collections import defaultdict
 import re
 from core.config_utils import load_key, get_joiner
+from core.artifact_store import load_artifact
 from rich.panel import Panel
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
@@ -25,17 +28,79 @@ def convert_to_srt_format(start_time, end_time):
     end_srt = seconds_to_hmsm(end_time)
     return f"{start_srt} --> {end_srt}"
 
+SPACE_PATTERN = re.compile(r'\s+')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+# words searched ahead of the previous match before falling back to a full scan
+MATCH_LOOKAHEAD = 200
+# a match scoring at least this is accepted, a weaker region match falls back to a full scan
+MATCH_ACCEPT = 0.75
+
 def remove_punctuation(text):
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)
+    text = SPACE_PATTERN.sub(' ', text)
+    text = PUNCTUATION_PATTERN.sub('', text)
     return text.strip()
 
+def char_grams(text):
+    text = text.replace(' ', '')
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i+2] for i in range(len(text) - 1)}
+
+def build_word_index(df_words):
+    """Normalize the word stream once: cleaned words, timestamp arrays and a char-bigram -> word positions index"""
+    words = [remove_punctuation(str(word).lower()) for word in df_words['text']]
+    starts = df_words['start'].to_numpy(dtype=float)
+    ends = df_words['end'].to_numpy(dtype=float)
+    gram_positions = defaultdict(list)
+    for pos, word in enumerate(words):
+        for gram in char_grams(word):
+            gram_positions[gram].append(pos)
+    return words, starts, ends, gram_positions
+
+def find_best_window(sentence, words, phrases, joiner, window_size, candidates, best=None):
+    """Score windows like the original sliding-window matcher: SequenceMatcher ratio times a length penalty.
+    Candidates are visited in ascending order and only a strictly better score replaces the best one."""
+    best = best or {'score': 0, 'start_index': None, 'phrase': ''}
+    matcher = SequenceMatcher(None, sentence, '')
+    for start_index in candidates:
+        phrase = phrases.get(start_index)
+        if phrase is None:
+            phrase = phrases[start_index] = joiner.join(words[start_index:start_index + window_size]).strip()
+        if not phrase:
+            continue
+        length_penalty = min(1, len(sentence) / len(phrase))
+        matcher.set_seq2(phrase)
+        # cheap upper bounds first, the full ratio only when it could beat the current best
+        if matcher.real_quick_ratio() * length_penalty <= best['score'] or matcher.quick_ratio() * length_penalty <= best['score']:
+            continue
+        adjusted_similarity = matcher.ratio() * length_penalty
+        if adjusted_similarity > best['score']:
+            best = {'score': adjusted_similarity, 'start_index': start_index, 'phrase': phrase}
+    return best
+
+def region_candidates(sentence, gram_positions, window_size, region_start, region_end):
+    """Window starts in [region_start, region_end) whose window shares at least one char bigram with the sentence"""
+    candidates = set()
+    for gram in char_grams(sentence):
+        positions = gram_positions.get(gram)
+        if not positions:
+            continue
+        lo = bisect_left(positions, region_start)
+        hi = bisect_left(positions, region_end + window_size - 1)
+        for pos in positions[lo:hi]:
+            candidates.update(range(max(region_start, pos - window_size + 1), min(pos, region_end - 1) + 1))
+    return sorted(candidates)
+
 def get_sentence_timestamps(df_words, df_sentences):
     time_stamp_list = []
     whisper_language = load_key("whisper.language")
     language = load_key("whisper.detected_language") if whisper_language == 'auto' else whisper_language
     joiner = get_joiner(language)
 
+    words, word_starts, word_ends, gram_positions = build_word_index(df_words)
+    phrases_by_size = defaultdict(dict)  # window_size -> {start_index: phrase}
+    cursor = 0  # sentences come in transcript order, so each search starts from the previous match
+
     # 使用 rich 进度条
     with Progress(
         SpinnerColumn(),
@@ -49,45 +114,33 @@ def get_sentence_timestamps(df_words, df_sentences):
         for idx, sentence in df_sentences['Source'].items():
             # 特殊处理：单个字母的句子直接返回原文的时间戳
             if len(remove_punctuation(sentence)) <= 1:
-                time_stamp_list.append((float(df_words['start'][0]), float(df_words['end'][0])))
+                time_stamp_list.append((float(word_starts[0]), float(word_ends[0])))
                 progress.update(task, advance=1)
                 continue
 
             sentence = remove_punctuation(sentence.lower())
-            best_match = {'score': 0, 'start': 0, 'end': 0, 'word_count': 0, 'phrase': ''}
             
             # 更严格的滑动窗口策略，减小窗口大小
             window_size = max(min(len(sentence.split()) + 1, 5), 3)  # 限制窗口大小在 3-5 之间
-            
-            for start_index in range(len(df_words) - window_size + 1):
-                current_phrase = ""
-                current_start_time = float(df_words['start'][start_index])
-                current_end_time = float(df_words['end'][start_index + window_size - 1])
-                
-                # 构建窗口内的短语
-                for j in range(start_index, start_index + window_size):
-                    word = remove_punctuation(df_words['text'][j].lower())
-                    current_phrase += word + joiner
-                
-                current_phrase = current_phrase.strip()
-                
-                # 计算相似度，增加对短语长度的惩罚
-                similarity = SequenceMatcher(None, sentence, current_phrase).ratio()
-                length_penalty = min(1, len(sentence) / len(current_phrase))
-                adjusted_similarity = similarity * length_penalty
-                
-                # 更新最佳匹配
-                if adjusted_similarity > best_match['score']:
-                    best_match = {
-                        'score': adjusted_similarity,
-                        'start': current_start_time,
-                        'end': current_end_time,
-                        'word_count': window_size,
-                        'phrase': current_phrase
-                    }
+            window_count = len(words) - window_size + 1
+            phrases = phrases_by_size[window_size]
+
+            # 先在上一个匹配位置之后的区域内搜索
+            region_end = min(window_count, cursor + MATCH_LOOKAHEAD)
+            candidates = region_candidates(sentence, gram_positions, window_size, cursor, region_end)
+            best_match = find_best_window(sentence, words, phrases, joiner, window_size, candidates)
+
+            # 区域内没有达到匹配阈值时，退回到全文搜索
+            if best_match['score'] < MATCH_ACCEPT:
+                best_match = find_best_window(sentence, words, phrases, joiner, window_size, range(window_count))
+
+            if best_match['start_index'] is not None:
+                best_match['start'] = float(word_starts[best_match['start_index']])
+                best_match['end'] = float(word_ends[best_match['start_index'] + window_size - 1])
+                cursor = best_match['start_index']
             
             # 提高匹配阈值，减少不准确的匹配
-            if best_match['score'] >= 0.75:  
+            if best_match['score'] >= MATCH_ACCEPT:
                 time_stamp_list.append((best_match['start'], best_match['end']))
                 
                 console.print(f"✅ 匹配成功: 原句 {repr(sentence)}, 匹配短语 {repr(best_match['phrase'])}, 相似度 {best_match['score']:.2f}")
@@ -163,9 +216,9 @@ def clean_translation(x):
     return autocorrect.format(cleaned)
 
 def align_timestamp_main():
-    df_text = pd.read_excel('output/log/cleaned_chunks.xlsx')
+    df_text = load_artifact('cleaned_chunks')
     df_text['text'] = df_text['text'].str.strip('"').str.strip()
-    df_translate = pd.read_excel('output/log/translation_results_for_subtitles.xlsx')
+    df_translate = load_artifact('translation_results_for_subtitles')
     df_translate['Translation'] = df_translate['Translation'].apply(clean_translation)
     subtitle_output_configs = [ 
         ('src_subtitles.srt', ['Source']),
@@ -177,7 +230,7 @@ def align_timestamp_main():
     console.print("[🎉📝] 字幕生成完成！请在 `output` 文件夹中查看")
 
     # for audio
-    df_translate_for_audio = pd.read_excel('output/log/translation_results.xlsx')
+    df_translate_for_audio = load_artifact('translation_results')
     df_translate_for_audio['Translation'] = df_translate_for_audio['Translation'].apply(clean_translation)
     subtitle_output_configs = [
         ('src_subs_for_audio.srt', ['Source']),
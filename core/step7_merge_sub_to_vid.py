@@ -26,65 +26,73 @@ TRANS_OUTLINE_COLOR = '&H000000'
 TRANS_OUTLINE_WIDTH = 1 
 TRANS_BACK_COLOR = '&H33000000'
 
-def check_gpu_available():
+# (encoder, extra global args, filter appended to the video chain, encoder args), tried in order
+HW_ENCODERS = [
+    ('h264_nvenc', [], '', ['-c:v', 'h264_nvenc']),
+    ('h264_qsv', [], '', ['-c:v', 'h264_qsv', '-preset', 'veryfast']),
+    ('h264_vaapi', ['-vaapi_device', '/dev/dri/renderD128'], ',format=nv12,hwupload', ['-c:v', 'h264_vaapi']),
+    ('h264_videotoolbox', [], '', ['-c:v', 'h264_videotoolbox']),
+]
+CPU_ENCODER = ('libx264', [], '', ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23'])
+_encoder_cache = {}
+
+def probe_encoder(encoder):
+    """A listed encoder may still lack the device or driver, so encode a few black frames with it"""
+    name, global_args, filter_suffix, encoder_args = encoder
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', *global_args, '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.2',
+           '-vf', f'format=yuv420p{filter_suffix}', *encoder_args, '-f', 'null', '-']
     try:
-        result = subprocess.run(['ffmpeg', '-encoders'], capture_output=True, text=True)
-        return 'h264_nvenc' in result.stdout
-    except:
+        return subprocess.run(cmd, capture_output=True, timeout=30).returncode == 0
+    except Exception:
         return False
 
-def merge_subtitles_to_video():
-    RESOLUTION = load_key("resolution")
-    TARGET_WIDTH, TARGET_HEIGHT = RESOLUTION.split('x')
-    video_file = find_video_files()
-    output_video = "output/output_video_with_subs.mp4"
-    os.makedirs(os.path.dirname(output_video), exist_ok=True)
-
-    # Check resolution
-    if RESOLUTION == '0x0':
-        rprint("[bold yellow]Warning: A 0-second black video will be generated as a placeholder as Resolution is set to 0x0.[/bold yellow]")
-
-        # Create a black frame
-        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_video, fourcc, 1, (1920, 1080))
-        out.write(frame)
-        out.release()
-
-        rprint("[bold green]Placeholder video has been generated.[/bold green]")
-        return
+def get_video_encoder():
+    """(name, global args, video filter suffix, encoder args) of the fastest working H.264 encoder, detected once"""
+    if 'encoder' not in _encoder_cache:
+        preferred = load_key("video_encoder", default='auto')
+        try:
+            listed = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True).stdout
+        except Exception:
+            listed = ''
+        candidates = [encoder for encoder in HW_ENCODERS if encoder[0] in listed]
+        if preferred != 'auto':
+            candidates = [encoder for encoder in candidates if encoder[0] == preferred]
+        encoder = next((encoder for encoder in candidates if probe_encoder(encoder)), CPU_ENCODER)
+        if encoder is CPU_ENCODER:
+            rprint("[bold yellow]No hardware H.264 encoder available, will use libx264 on the CPU.[/bold yellow]")
+        else:
+            rprint(f"[bold green]Hardware encoder {encoder[0]} detected, will use GPU acceleration.[/bold green]")
+        _encoder_cache['encoder'] = encoder
+    return _encoder_cache['encoder']
 
-    en_srt = "output/src_subtitles.srt"
-    trans_srt = "output/trans_subtitles.srt"
+def get_subtitle_filter(src_srt, trans_srt):
+    """Scale and pad to the configured resolution, then burn in both subtitle tracks"""
+    TARGET_WIDTH, TARGET_HEIGHT = load_key("resolution").split('x')
+    return (
+        f"scale={TARGET_WIDTH}:{TARGET_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={TARGET_WIDTH}:{TARGET_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+        f"subtitles={src_srt}:force_style='FontSize={SRC_FONT_SIZE},FontName={FONT_NAME}," 
+        f"PrimaryColour={SRC_FONT_COLOR},OutlineColour={SRC_OUTLINE_COLOR},OutlineWidth={SRC_OUTLINE_WIDTH},"
+        f"ShadowColour={SRC_SHADOW_COLOR},BorderStyle=1',"
+        f"subtitles={trans_srt}:force_style='FontSize={TRANS_FONT_SIZE},FontName={TRANS_FONT_NAME},"
+        f"PrimaryColour={TRANS_FONT_COLOR},OutlineColour={TRANS_OUTLINE_COLOR},OutlineWidth={TRANS_OUTLINE_WIDTH},"
+        f"BackColour={TRANS_BACK_COLOR},Alignment=2,MarginV=25,BorderStyle=4'"
+    )
 
-    if not os.path.exists(en_srt) or not os.path.exists(trans_srt):
-        print("Subtitle files not found in the 'output' directory.")
-        exit(1)
+def write_placeholder_video(output_video):
+    rprint("[bold yellow]Warning: A 0-second black video will be generated as a placeholder as Resolution is set to 0x0.[/bold yellow]")
 
-    ffmpeg_cmd = [
-        'ffmpeg', '-i', video_file,
-        '-vf', (
-            f"scale={TARGET_WIDTH}:{TARGET_HEIGHT}:force_original_aspect_ratio=decrease,"
-            f"pad={TARGET_WIDTH}:{TARGET_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
-            f"subtitles={en_srt}:force_style='FontSize={SRC_FONT_SIZE},FontName={FONT_NAME}," 
-            f"PrimaryColour={SRC_FONT_COLOR},OutlineColour={SRC_OUTLINE_COLOR},OutlineWidth={SRC_OUTLINE_WIDTH},"
-            f"ShadowColour={SRC_SHADOW_COLOR},BorderStyle=1',"
-            f"subtitles={trans_srt}:force_style='FontSize={TRANS_FONT_SIZE},FontName={TRANS_FONT_NAME},"
-            f"PrimaryColour={TRANS_FONT_COLOR},OutlineColour={TRANS_OUTLINE_COLOR},OutlineWidth={TRANS_OUTLINE_WIDTH},"
-            f"BackColour={TRANS_BACK_COLOR},Alignment=2,MarginV=25,BorderStyle=4'"
-        ).encode('utf-8'),
-    ]
+    # Create a black frame
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(output_video, fourcc, 1, (1920, 1080))
+    out.write(frame)
+    out.release()
 
-    gpu_available = check_gpu_available()
-    if gpu_available:
-        rprint("[bold green]NVIDIA GPU encoder detected, will use GPU acceleration.[/bold green]")
-        ffmpeg_cmd.extend(['-c:v', 'h264_nvenc'])
-    else:
-        rprint("[bold yellow]No NVIDIA GPU encoder detected, will use CPU instead.[/bold yellow]")
-    
-    ffmpeg_cmd.extend(['-y', output_video])
+    rprint("[bold green]Placeholder video has been generated.[/bold green]")
 
-    print("🎬 Start merging subtitles to video...")
+def run_ffmpeg(ffmpeg_cmd, done_message):
+    """Run ffmpeg printing its progress lines, returns True on success"""
     start_time = time.time()
     process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8')  # 指定 UTF-8 编码
 
@@ -96,7 +104,8 @@ def merge_subtitles_to_video():
         process.wait()
         if process.returncode == 0:
             print(f"\n[Process completed in {time.time() - start_time:.2f} seconds.]")
-            print("🎉🎥 Subtitles merging to video completed! Please check in the `output` folder 👀")
+            print(done_message)
+            return True
         else:
             print("\n[Error occurred during FFmpeg execution.]")
     except KeyboardInterrupt:
@@ -106,6 +115,106 @@ def merge_subtitles_to_video():
         print(f"\n[An unexpected error occurred: {e}]")
         if process.poll() is None:
             process.kill()
+    return False
+
+# ASS sidecars use the same style values as the burn-in, on libass' default 384x288 canvas for SRT input
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 384
+PlayResY: 288
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,{font},{size},{primary},{primary},{outline_color},{back},0,0,0,0,100,100,0,0,{border_style},{outline},0,2,10,10,{margin_v},1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+SRC_ASS_STYLE = dict(font=FONT_NAME, size=SRC_FONT_SIZE, primary=SRC_FONT_COLOR, outline_color=SRC_OUTLINE_COLOR,
+                     back=SRC_SHADOW_COLOR, border_style=1, outline=SRC_OUTLINE_WIDTH, margin_v=10)
+TRANS_ASS_STYLE = dict(font=TRANS_FONT_NAME, size=TRANS_FONT_SIZE, primary=TRANS_FONT_COLOR, outline_color=TRANS_OUTLINE_COLOR,
+                       back=TRANS_BACK_COLOR, border_style=4, outline=TRANS_OUTLINE_WIDTH, margin_v=25)
+
+def srt_time_to_ass(time_str):
+    """00:01:02,345 -> 0:01:02.34"""
+    hours, minutes, seconds = time_str.strip().replace(',', '.').split(':')
+    return f"{int(hours)}:{minutes}:{seconds[:5]}"
+
+def escape_ass_text(text):
+    """Braces would start override tags, line breaks become \\N"""
+    text = text.replace('{', '\\{').replace('}', '\\}')
+    return '\\N'.join(line.strip() for line in text.replace('\r', '').split('\n'))
+
+def write_ass_sidecar(srt_file, ass_file, style):
+    with open(srt_file, 'r', encoding='utf-8') as f:
+        blocks = f.read().strip().split('\n\n')
+
+    events = []
+    for block in blocks:
+        lines = block.strip().split('\n')
+        if len(lines) < 3 or '-->' not in lines[1]:
+            continue
+        start, end = lines[1].split('-->')
+        text = escape_ass_text('\n'.join(lines[2:]))
+        events.append(f"Dialogue: 0,{srt_time_to_ass(start)},{srt_time_to_ass(end)},Default,,0,0,0,,{text}")
+
+    with open(ass_file, 'w', encoding='utf-8') as f:
+        f.write(ASS_HEADER.format(**style) + '\n'.join(events) + '\n')
+
+def mux_soft_subtitles(video_file, src_srt, trans_srt, output_video):
+    """Copy the video stream and add both subtitle tracks as mov_text, plus styled ASS sidecars next to the srt files"""
+    write_ass_sidecar(src_srt, src_srt.replace('.srt', '.ass'), SRC_ASS_STYLE)
+    write_ass_sidecar(trans_srt, trans_srt.replace('.srt', '.ass'), TRANS_ASS_STYLE)
+
+    def build_cmd(audio_args):
+        return [
+            'ffmpeg', '-i', video_file, '-i', src_srt, '-i', trans_srt,
+            '-map', '0:v', '-map', '0:a?', '-map', '1', '-map', '2',
+            '-c:v', 'copy', *audio_args, '-c:s', 'mov_text',
+            '-metadata:s:s:0', 'handler_name=Source', '-metadata:s:s:1', 'handler_name=Translation',
+            '-disposition:s:0', '0', '-disposition:s:1', 'default',
+            '-y', output_video
+        ]
+    done_message = "🎉🎥 Soft subtitles added to video, ASS subtitles saved next to the srt files! Please check in the `output` folder 👀"
+
+    print("🎬 Start adding soft subtitles to video...")
+    if run_ffmpeg(build_cmd(['-c:a', 'copy']), done_message):
+        return True
+    # e.g. WMA audio cannot go into mp4 as is
+    rprint("[bold yellow]Audio stream cannot be copied into mp4, re-encoding it to AAC.[/bold yellow]")
+    return run_ffmpeg(build_cmd(['-c:a', 'aac', '-b:a', '192k']), done_message)
+
+def merge_subtitles_to_video():
+    RESOLUTION = load_key("resolution")
+    video_file = find_video_files()
+    output_video = "output/output_video_with_subs.mp4"
+    os.makedirs(os.path.dirname(output_video), exist_ok=True)
+
+    # Check resolution
+    if RESOLUTION == '0x0':
+        write_placeholder_video(output_video)
+        return
+
+    en_srt = "output/src_subtitles.srt"
+    trans_srt = "output/trans_subtitles.srt"
+
+    if not os.path.exists(en_srt) or not os.path.exists(trans_srt):
+        print("Subtitle files not found in the 'output' directory.")
+        exit(1)
+
+    if load_key("subtitle_mode", default='burn') == 'soft':
+        mux_soft_subtitles(video_file, en_srt, trans_srt, output_video)
+        return
+
+    _, global_args, filter_suffix, encoder_args = get_video_encoder()
+    ffmpeg_cmd = [
+        'ffmpeg', *global_args, '-i', video_file,
+        '-vf', (get_subtitle_filter(en_srt, trans_srt) + filter_suffix).encode('utf-8'),
+        *encoder_args, '-y', output_video
+    ]
+
+    print("🎬 Start merging subtitles to video...")
+    run_ffmpeg(ffmpeg_cmd, "🎉🎥 Subtitles merging to video completed! Please check in the `output` folder 👀")
 
 if __name__ == "__main__":
     merge_subtitles_to_video()
@@ -3,35 +3,26 @@ import datetime
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import re
-from core.ask_gpt import ask_gpt
-from core.prompts_storage import get_subtitle_trim_prompt
+import numpy as np
+from core.ask_gpt import ask_gpt, ask_gpt_batch
+from core.prompts_storage import get_subtitle_trim_prompt, get_subtitle_trim_batch_prompt
 from rich import print as rprint
 from rich.panel import Panel
 from rich.console import Console
 from core.config_utils import load_key  
+from core.text_metrics import reading_count, estimate_reading_duration, estimate_reading_durations
+from core.artifact_store import save_artifact, artifact_exists, artifact_path
 
 console = Console()
 speed_factor = load_key("speed_factor")
+TRIM_GROUP_SIZE = 10  # subtitles per grouped trim prompt
+
+def get_reading_multiplier():
+    return speed_factor['normal'] * speed_factor['max']
 
 def check_len_then_trim(text, duration):
-    multiplier = speed_factor['normal'] * speed_factor['max']
-    # Define speech speed: characters/second or words/second, punctuation/second
-    speed_zh_ja = 4 * multiplier  # Chinese and Japanese characters per second
-    speed_en_and_others = 5 * multiplier   # Words per second for English and other languages
-    speed_punctuation = 4 * multiplier   # Punctuation marks per second
-    
-    # Count characters, words, and punctuation for each language
-    chinese_japanese_chars = len(re.findall(r'[\u4e00-\u9fff\u3040-\u30ff\u3400-\u4dbf\uf900-\ufaff\uff66-\uff9f]', text))
-    en_and_others_words = len(re.findall(r'\b[a-zA-ZàâçéèêëîïôûùüÿñæœáéíóúüñÁÉÍÓÚÜÑàèéìíîòóùúÀÈÉÌÍÎÒÓÙÚäöüßÄÖÜа-яА-Я]+\b', text))
-    punctuation_count = len(re.findall(r'[,.!?;:，。！？；：](?=.)', text))
-    
-    # Estimate duration for each language part and punctuation
-    chinese_japanese_duration = chinese_japanese_chars / speed_zh_ja
-    en_and_others_duration = en_and_others_words / speed_en_and_others
-    punctuation_duration = punctuation_count / speed_punctuation
-    
-    # Total estimated duration
-    estimated_duration = chinese_japanese_duration + en_and_others_duration + punctuation_duration
+    chinese_japanese_chars, en_and_others_words, punctuation_count = reading_count(text)
+    estimated_duration = estimate_reading_duration(text, get_reading_multiplier())
     
     console.print(f"Subtitle text: {text}, "
                   f"Subtitle info: Chinese/Japanese chars: {chinese_japanese_chars}, "
@@ -66,6 +57,56 @@ def check_len_then_trim(text, duration):
     else:
         return text
 
+def trim_subtitles_batch(texts, durations):
+    """
+    Trim every subtitle whose estimated reading time exceeds its duration.
+    Over-long lines are sent in groups of `trim_group_size` per prompt and the groups run concurrently;
+    an item the group answer misses, gets wrong or leaves too long falls back to check_len_then_trim on its own.
+    """
+    texts = list(texts)
+    durations = list(durations)
+    too_long = np.nonzero(estimate_reading_durations(texts, get_reading_multiplier()) > np.asarray(durations, dtype=float))[0].tolist()
+    if not too_long:
+        return texts
+
+    group_size = max(int(load_key("trim_group_size", default=TRIM_GROUP_SIZE)), 1)
+    groups = [too_long[i:i + group_size] for i in range(0, len(too_long), group_size)]
+    console.print(f"[yellow]✂️ Trimming {len(too_long)} of {len(texts)} subtitles in {len(groups)} grouped requests...[/yellow]")
+
+    def valid_trim_batch(response):
+        # 只校验整体结构，逐条结果在下面单独校验，个别条目出错不影响同组其他条目
+        if not isinstance(response, dict):
+            return {'status': 'error', 'message': '返回必须是一个字典'}
+        return {'status': 'success', 'message': ''}
+
+    requests = [dict(prompt=get_subtitle_trim_batch_prompt([(texts[i], durations[i]) for i in group]), response_json=True,
+                     log_title='subtitle_trim', valid_def=valid_trim_batch) for group in groups]
+    fallbacks, trimmed = [], []
+    for group, response in zip(groups, ask_gpt_batch(requests)):
+        if isinstance(response, Exception):
+            fallbacks.extend(group)
+            continue
+        for number, i in enumerate(group, 1):
+            item = response.get(str(number))
+            shortened_text = item.get('trans_text_processed') if isinstance(item, dict) else None
+            if not isinstance(shortened_text, str) or not shortened_text.strip():
+                fallbacks.append(i)
+                continue
+            rprint(Panel(f"Subtitle before shortening: {texts[i]}\nSubtitle after shortening: {shortened_text}", title="Subtitle Shortening Result", border_style="green"))
+            texts[i] = shortened_text.strip()
+            trimmed.append(i)
+
+    # a group answer may still be too long for its duration, trim those again on their own
+    if trimmed:
+        trimmed_durations = estimate_reading_durations([texts[i] for i in trimmed], get_reading_multiplier())
+        fallbacks.extend(i for i, estimated in zip(trimmed, trimmed_durations) if estimated > durations[i])
+
+    if fallbacks:
+        console.print(f"[yellow]⚠️ {len(fallbacks)} subtitles were missing or still too long after the grouped requests, trimming them one by one[/yellow]")
+    for i in fallbacks:
+        texts[i] = check_len_then_trim(texts[i], durations[i])
+    return texts
+
 # 其余代码保持不变
 def pre_process_srt(df):
     """
@@ -270,7 +311,7 @@ def process_srt():
     
     # 检查并修剪字幕长度，执行两次以确保字幕长度在限制范围内
     for _ in range(2):
-        df['text'] = df.apply(lambda x: check_len_then_trim(x['text'], x['duration']), axis=1)
+        df['text'] = trim_subtitles_batch(df['text'], df['duration'])
 
     # 最后预处理字幕，删除开始时间异常的字幕
     df = pre_process_srt(df)
@@ -278,15 +319,14 @@ def process_srt():
     return df
 
 def gen_audio_task_main():
-    output_dir = 'output/audio'
-    tasks_file = os.path.join(output_dir, 'sovits_tasks.xlsx')
+    tasks_file = artifact_path('sovits_tasks')
     
-    if os.path.exists(tasks_file):
+    if artifact_exists('sovits_tasks'):
         rprint(Panel(f"{tasks_file} already exists, skip.", title="Info", border_style="blue"))
     else:
         df = process_srt()
         console.print(df)
-        df.to_excel(tasks_file, index=False)
+        tasks_file = save_artifact(df, 'sovits_tasks')
 
         rprint(Panel(f"Successfully generated {tasks_file}", title="Success", border_style="green"))
 
@@ -5,9 +5,9 @@ from rich import print as rprint
 from rich.panel import Panel
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
-import pandas as pd
 import soundfile as sf
 from core.all_whisper_methods.whisperXapi import AUDIO_DIR, VOCAL_AUDIO_FILE
+from core.artifact_store import load_artifact
 console = Console()
 
 def parse_srt(srt_content):
@@ -42,7 +42,7 @@ def extract_refer_audio_main():
     if os.path.exists(os.path.join(output_dir, 'segs', '1.wav')):
         rprint(Panel(f"{os.path.join(output_dir, 'segs', '1.wav')} already exists, skip extraction.", title="Info", border_style="blue"))
     else:
-        df = pd.read_excel(os.path.join(output_dir, 'sovits_tasks.xlsx'))
+        df = load_artifact('sovits_tasks')
         
         refers_dir = os.path.join(output_dir, 'refers')
         os.makedirs(refers_dir, exist_ok=True)
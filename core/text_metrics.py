@@ -0,0 +1,125 @@
+import os, sys
+import re
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Subtitle length and reading-time metrics, computed for a whole column at once:
+# every text is turned into UTF-32 code points, all texts are concatenated, and per-character
+# results are summed back per text with a cumulative sum.
+
+# (first, last code point, weight) for calc_len, other characters weigh 1
+CHAR_WEIGHT_RANGES = [
+    (0x4E00, 0x9FFF, 1.75),  # Chinese
+    (0x3040, 0x30FF, 1.75),  # Japanese
+    (0xAC00, 0xD7A3, 1.5),  # Korean
+    (0x1100, 0x11FF, 1.5),  # Korean Jamo
+    (0x0E00, 0x0E7F, 1),  # Thai
+    (0xFF01, 0xFF5E, 1.75),  # full-width symbols
+]
+# characters read at CJK speed in the reading-time estimate
+CJK_RANGES = [(0x4E00, 0x9FFF), (0x3040, 0x30FF), (0x3400, 0x4DBF), (0xF900, 0xFAFF), (0xFF66, 0xFF9F)]
+# letters that make up a word read at the speed of English and other languages
+WORD_LETTERS = 'a-zA-ZàâçéèêëîïôûùüÿñæœáéíóúüñÁÉÍÓÚÜÑàèéìíîòóùúÀÈÉÌÍÎÒÓÙÚäöüßÄÖÜа-яА-Я'
+PUNCTUATION = ',.!?;:，。！？；：'
+
+# the same rules as regexes, for single lines
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3040-\u30ff\u3400-\u4dbf\uf900-\ufaff\uff66-\uff9f]')
+WORD_PATTERN = re.compile(rf'\b[{WORD_LETTERS}]+\b')
+PUNCTUATION_PATTERN = re.compile(rf'[{PUNCTUATION}](?=.)')
+
+# bits of the per code point flag table
+CJK, LETTER, WORD_CHAR, PUNCT = 1, 2, 4, 8
+
+_tables = {}
+
+def _lookup_tables():
+    """Per code point lookup tables, built once: calc_len weights and the CJK / LETTER / WORD_CHAR / PUNCT flags"""
+    if not _tables:
+        weights = np.ones(0x110000, dtype=np.float64)
+        for first, last, weight in reversed(CHAR_WEIGHT_RANGES):  # the first matching range wins
+            weights[first:last + 1] = weight
+        flags = np.zeros(0x110000, dtype=np.uint8)
+        for first, last in CJK_RANGES:
+            flags[first:last + 1] |= CJK
+        flags[[ord(char) for char in re.findall(rf'[{WORD_LETTERS}]', ''.join(map(chr, range(0x500))))]] |= LETTER
+        # re's \w: str.isalnum() or underscore
+        word_chars = np.fromiter((chr(code).isalnum() for code in range(0x110000)), dtype=bool, count=0x110000)
+        word_chars[ord('_')] = True
+        flags[word_chars] |= WORD_CHAR
+        flags[[ord(char) for char in PUNCTUATION]] |= PUNCT
+        _tables.update(weights=weights, flags=flags)
+    return _tables
+
+def _code_points(texts):
+    """Concatenated code points of all texts and the end offset of each text"""
+    texts = [str(text) for text in texts]
+    joined = ''.join(texts)
+    code_points = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    ends = np.cumsum([len(text) for text in texts], dtype=np.int64)
+    return code_points, ends
+
+def _sum_per_text(values, ends):
+    totals = np.concatenate([[0], np.cumsum(values)])
+    starts = np.concatenate([[0], ends[:-1]])
+    return totals[ends] - totals[starts]
+
+def calc_lens(texts):
+    """Char-weight length of every text, CJK and full-width characters count more than Latin ones"""
+    code_points, ends = _code_points(texts)
+    if not len(ends):
+        return np.zeros(0)
+    return _sum_per_text(_lookup_tables()['weights'][code_points], ends)
+
+def calc_len(text):
+    return float(calc_lens([text])[0])
+
+def reading_counts(texts):
+    """(CJK characters, words, punctuation marks not at the end) per text, as counted by the reading-time estimate"""
+    code_points, ends = _code_points(texts)
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    flags = _lookup_tables()['flags'][code_points]
+    n = len(code_points)
+    last_of_text = np.zeros(n, dtype=bool)
+    first_of_text = np.zeros(n, dtype=bool)
+    nonempty = np.concatenate([[ends[0] > 0], ends[1:] > ends[:-1]])
+    last_of_text[ends[nonempty] - 1] = True
+    first_of_text[np.concatenate([[0], ends[:-1]])[nonempty]] = True
+
+    cjk = (flags & CJK) > 0
+
+    # a word is a maximal run of letters with no other \w character right before or after it
+    letters = (flags & LETTER) > 0
+    word_chars = (flags & WORD_CHAR) > 0
+    previous_letter = np.concatenate([[False], letters[:-1]]) & ~first_of_text
+    next_letter = np.concatenate([letters[1:], [False]]) & ~last_of_text
+    run_starts = np.flatnonzero(letters & ~previous_letter)
+    run_ends = np.flatnonzero(letters & ~next_letter)  # paired with run_starts, runs never cross texts
+    before_is_word = (run_starts > 0) & ~first_of_text[run_starts] & word_chars[np.maximum(run_starts - 1, 0)]
+    after_is_word = (run_ends < n - 1) & ~last_of_text[run_ends] & word_chars[np.minimum(run_ends + 1, n - 1)]
+    word_ends = run_ends[~before_is_word & ~after_is_word]
+    words = np.bincount(np.searchsorted(ends, word_ends, side='right'), minlength=len(ends))
+
+    # punctuation followed by any character but a newline in the same text
+    next_is_newline = np.concatenate([code_points[1:] == ord('\n'), [False]])
+    punctuation = ((flags & PUNCT) > 0) & ~last_of_text & ~next_is_newline
+
+    return (_sum_per_text(cjk, ends).astype(np.int64),
+            words.astype(np.int64),
+            _sum_per_text(punctuation, ends).astype(np.int64))
+
+def reading_count(text):
+    """reading_counts for a single text, plain precompiled regexes are cheaper than array setup for one line"""
+    text = str(text)
+    return len(CJK_PATTERN.findall(text)), len(WORD_PATTERN.findall(text)), len(PUNCTUATION_PATTERN.findall(text))
+
+def _reading_duration(cjk, words, punctuation, multiplier):
+    # Speech speed at multiplier 1: 4 CJK characters, 5 words and 4 punctuation marks per second
+    return cjk / (4 * multiplier) + words / (5 * multiplier) + punctuation / (4 * multiplier)
+
+def estimate_reading_durations(texts, multiplier):
+    """Estimated seconds to read every text aloud, multiplier scales the base speeds"""
+    return _reading_duration(*reading_counts(texts), multiplier)
+
+def estimate_reading_duration(text, multiplier):
+    return _reading_duration(*reading_count(text), multiplier)
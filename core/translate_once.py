@@ -1,7 +1,8 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.ask_gpt import ask_gpt
-from core.prompts_storage import generate_shared_prompt, get_prompt_faithfulness, get_prompt_expressiveness
+from core.prompts_storage import generate_shared_prompt, get_prompt_faithfulness, get_prompt_expressiveness, get_prompt_one_shot
+from core.config_utils import load_key
 from rich.panel import Panel
 from rich.console import Console
 from rich.table import Table
@@ -10,6 +11,10 @@ import re
 
 console = Console()
 
+FAITHFULNESS_KEYS = ["origin", "direct"]
+# the expressiveness answer and the one-shot answer have the same shape
+EXPRESSIVENESS_KEYS = ["origin", "direct", "reflection", "free"]
+
 def valid_translate_result(result: dict, required_keys: list, required_sub_keys: list):
     # Check for the required key
     if not all(key in result for key in required_keys):
@@ -22,11 +27,9 @@ def valid_translate_result(result: dict, required_keys: list, required_sub_keys:
 
     return {"status": "success", "message": "Translation completed"}
 
-def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_to_note_prompt, summary_prompt, index = 0):
-    shared_prompt = generate_shared_prompt(previous_content_prompt, after_cotent_prompt, summary_prompt, things_to_note_prompt)
-
-    
-    def valid_faith(response_data):
+def valid_translation(lines, required_sub_keys):
+    """Validator for the line-keyed translation answers of every translation mode"""
+    def valid_def(response_data):
         # 严格校验返回数据的格式
         if not isinstance(response_data, dict):
             return {"status": "error", "message": "返回数据必须是字典"}
@@ -44,68 +47,57 @@ def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_
             if not isinstance(value, dict):
                 return {"status": "error", "message": f"键 {key} 的值必须是字典"}
             
-            if not {"origin", "direct"}.issubset(value.keys()):
-                return {"status": "error", "message": f"键 {key} 的值必须包含 'origin' 和 'direct' 两个键"}
-            
-            if not all(isinstance(v, str) for v in value.values()):
-                return {"status": "error", "message": f"键 {key} 的 'origin' 和 'direct' 值必须是字符串"}
-        
-        return {"status": "success", "message": "Translation completed"}
-
-    def valid_express(response_data):
-        # 严格校验返回数据的格式
-        if not isinstance(response_data, dict):
-            return {"status": "error", "message": "返回数据必须是字典"}
-        
-        if len(lines.split('\n')) != len(response_data):
-             return {"status": "error", "message": "长度不匹配"}
-
-        # 检查键是否为连续的字符串数字
-        keys = list(response_data.keys())
-        if not all(str(i) in keys for i in range(1, len(keys) + 1)):
-            return {"status": "error", "message": "键必须是连续的字符串数字，如 '1', '2', '3'"}
-        
-        # 检查每个值的格式
-        for key, value in response_data.items():
-            if not isinstance(value, dict):
-                return {"status": "error", "message": f"键 {key} 的值必须是字典"}
-            
-            # 检查是否包含 'origin', 'direct', 'reflection', 'free' 四个键
-            if not {"origin", "direct", "reflection", "free"}.issubset(value.keys()):
-                return {"status": "error", "message": f"键 {key} 的值必须包含 'origin', 'direct', 'reflection', 'free' 四个键"}
+            if not set(required_sub_keys).issubset(value.keys()):
+                return {"status": "error", "message": f"键 {key} 的值必须包含 {', '.join(required_sub_keys)}"}
             
-            # 检查所有值是否为字符串
             if not all(isinstance(v, str) for v in value.values()):
                 return {"status": "error", "message": f"键 {key} 的所有值必须是字符串"}
         
         return {"status": "success", "message": "Translation completed"}
-   
-
+    return valid_def
+
+def partial_valid_translation(lines):
+    """Checks the line keys of a translation answer while it streams: '1', '2', ... and no more than there are lines"""
+    line_count = len(lines.split('\n'))
+    def partial_valid_def(keys):
+        if keys[-1] != str(len(keys)):
+            return {"status": "error", "message": f"键必须是连续的字符串数字，第 {len(keys)} 个键是 '{keys[-1]}'"}
+        if len(keys) > line_count:
+            return {"status": "error", "message": f"行数超过原文的 {line_count} 行"}
+        return {"status": "success", "message": "Partial answer looks valid"}
+    return partial_valid_def
+
+def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_to_note_prompt, summary_prompt, index = 0, mode = None):
+    shared_prompt = generate_shared_prompt(previous_content_prompt, after_cotent_prompt, summary_prompt, things_to_note_prompt)
 
     # Retry translation if the length of the original text and the translated text are not the same, or if the specified key is missing
-    def retry_translation(prompt, step_name):
+    def retry_translation(prompt, step_name, valid_def):
         
         for retry in range(5):
-            if step_name == 'faithfulness':
-                result = ask_gpt(prompt, response_json=True, valid_def=valid_faith, log_title=f'translate_{step_name}', re_try = retry!=1)
-            elif step_name == 'expressiveness':
-                result = ask_gpt(prompt, response_json=True, valid_def=valid_express, log_title=f'translate_{step_name}', re_try = retry!=1)
+            result = ask_gpt(prompt, response_json=True, valid_def=valid_def, log_title=f'translate_{step_name}', re_try = retry!=1, partial_valid_def=partial_valid_translation(lines))
             if len(lines.split('\n')) == len(result):
                 return result
             if retry != 1:
                 console.print(f'[yellow]⚠️ {step_name.capitalize()} translation of block {index} failed, Retry...[/yellow]')
         raise ValueError(f'[red]❌ {step_name.capitalize()} translation of block {index} failed after 5 retries. Please check `output/gpt_log/error.json` for more details.[/red]')
 
-    ## Step 1: Faithful to the Original Text
-    prompt1 = get_prompt_faithfulness(lines, shared_prompt)
-    faith_result = retry_translation(prompt1, 'faithfulness')
+    mode = mode or load_key("translation_mode", default='two_step')
+    if mode == 'one_shot':
+        ## Direct translation, reflection and free translation in a single request
+        prompt = get_prompt_one_shot(lines, shared_prompt)
+        express_result = retry_translation(prompt, 'one_shot', valid_translation(lines, EXPRESSIVENESS_KEYS))
+        faith_result = express_result
+    else:
+        ## Step 1: Faithful to the Original Text
+        prompt1 = get_prompt_faithfulness(lines, shared_prompt)
+        faith_result = retry_translation(prompt1, 'faithfulness', valid_translation(lines, FAITHFULNESS_KEYS))
 
-    for i in faith_result:
-        faith_result[i]["direct"] = faith_result[i]["direct"].replace('\n', ' ')
+        for i in faith_result:
+            faith_result[i]["direct"] = faith_result[i]["direct"].replace('\n', ' ')
 
-    ## Step 2: Express Smoothly  
-    prompt2 = get_prompt_expressiveness(faith_result, lines, shared_prompt)
-    express_result = retry_translation(prompt2, 'expressiveness')
+        ## Step 2: Express Smoothly  
+        prompt2 = get_prompt_expressiveness(faith_result, lines, shared_prompt)
+        express_result = retry_translation(prompt2, 'expressiveness', valid_translation(lines, EXPRESSIVENESS_KEYS))
 
     table = Table(title="Translation Results", show_header=False, box=box.ROUNDED)
     table.add_column("Translations", style="bold")
@@ -121,7 +113,7 @@ def translate_lines(lines, previous_content_prompt, after_cotent_prompt, things_
     translate_result = "\n".join([express_result[i]["free"].replace('\n', ' ').strip() for i in express_result])
 
     if len(lines.split('\n')) != len(translate_result.split('\n')):
-        console.print(Panel(f'[red]❌ Translation of block {index} failed, Length Mismatch, Please check `output/gpt_log/translate_expressiveness.json`[/red]'))
+        console.print(Panel(f'[red]❌ Translation of block {index} failed, Length Mismatch, Please check `output/gpt_log/translate_{"one_shot" if mode == "one_shot" else "expressiveness"}.json`[/red]'))
         raise ValueError(f'Origin ···{lines}···,\nbut got ···{translate_result}···')
 
     return translate_result, lines
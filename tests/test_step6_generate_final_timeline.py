@@ -0,0 +1,26 @@
+import os, sys
+import pandas as pd
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("autocorrect_py")
+from core import step6_generate_final_timeline as step6
+
+@pytest.fixture(autouse=True)
+def english_config(monkeypatch):
+    monkeypatch.setattr(step6, "load_key", lambda key: "en")
+    monkeypatch.setattr(step6, "get_joiner", lambda language: " ")
+
+def make_words(texts):
+    return pd.DataFrame({'text': texts, 'start': [float(i) for i in range(len(texts))], 'end': [i + 0.5 for i in range(len(texts))]})
+
+def test_match_beyond_lookahead_uses_full_scan():
+    filler = ["thermometers", "overwhelming", "shipwrecked", "otherworldly"] * 100
+    true_start = step6.MATCH_LOOKAHEAD + 50
+    texts = filler[:true_start] + ["hello", "there", "world"] + filler[true_start:]
+    df_sentences = pd.DataFrame({'Source': ["Hello there world."]})
+
+    timestamps = step6.get_sentence_timestamps(make_words(texts), df_sentences)
+
+    start, _ = timestamps[0]
+    assert start == float(true_start)